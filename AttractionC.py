@@ -5,21 +5,37 @@ Main application for Gate C ticket validation
 """
 
 import cv2
+import os
 import sys
 import time
-from pyzbar import pyzbar
 from ticket_database import TicketDatabase
 from display_manager import DisplayManager
+from camera_grabber import CameraGrabber
+from qr_decoder import QRDecoder
+from ticket_parser import QR_CODE_FORMAT
+
+# Use OpenCV's SIMD (NEON on the Pi) kernels and keep its thread pool small - the
+# frames it works on are tiny, and the capture thread and decode pool need cores too
+cv2.setUseOptimized(True)
+cv2.setNumThreads(min(2, os.cpu_count() or 1))
 
 class AttractionCScanner:
     def __init__(self):
         """Initialize Attraction C scanner"""
         self.attraction_name = "Cactus Garden"
         self.db = TicketDatabase(self.attraction_name)
+        # Bound matcher - stray/non-ticket QR codes are rejected without a SQLite round-trip
+        self._is_ticket_code = QR_CODE_FORMAT.fullmatch
         self.display = DisplayManager(self.attraction_name)
+        self.decoder = QRDecoder()
         self.camera = None
+        self.grabber = None
         self.running = True
         
+        # Waiting-screen stats cache (refreshed at most once per second)
+        self._stats_cache = None
+        self._stats_cache_ts = 0.0
+        
         # Add sample tickets for testing (if enabled in config)
         self.db.add_sample_tickets_if_enabled()
         
@@ -31,28 +47,56 @@ class AttractionCScanner:
             print("[ERROR] Could not open camera")
             return False
         
+        # MJPEG keeps USB bandwidth low enough for a real 30 fps at 640x480
+        self.camera.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"MJPG"))
+        
+        # Keep only one driver buffer so every read is the newest frame
+        self.camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        
         # Set camera properties for better performance
         self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
         self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
         self.camera.set(cv2.CAP_PROP_FPS, 30)
         
+        # Drain the camera in the background so decoding never waits on capture
+        self.grabber = CameraGrabber(self.camera)
+        self.grabber.start()
+        
         print("[SUCCESS] Camera initialized successfully")
         return True
     
     def scan_qr_code(self, frame):
         """Scan for QR codes in the frame"""
         try:
-            qr_codes = pyzbar.decode(frame)
-            if qr_codes:
-                # Return the first QR code found
-                return qr_codes[0].data.decode('utf-8')
+            return self.decoder.decode(frame)
         except Exception as e:
             print(f"[ERROR] Error scanning QR code: {e}")
         
         return None
     
+    def _hud_stats(self):
+        """Return (today_scans, db_stats) for the status bar from one database query"""
+        today_scans, total_tickets, unsynced_count = self.db.get_hud_snapshot()
+        db_stats = {'total_tickets': total_tickets, 'unsynced_count': unsynced_count}
+        return today_scans, db_stats
+    
+    def _cached_stats(self):
+        """Return (today_scans, db_stats), hitting the database at most once per second"""
+        now = time.monotonic()
+        if now - self._stats_cache_ts > 1.0:
+            self._stats_cache = self._hud_stats()
+            self._stats_cache_ts = now
+        return self._stats_cache
+    
     def validate_ticket(self, qr_data):
         """Validate ticket and return result"""
+        if not self._is_ticket_code(qr_data):
+            return {
+                'valid': False,
+                'reason': 'Invalid QR code format',
+                'ticket_info': None
+            }
+        
         # Validate with database using optimized method (includes attraction checking)
         result = self.db.validate_and_log_ticket(qr_data, "C")
         
@@ -73,19 +117,21 @@ class AttractionCScanner:
         """Process QR code scan"""
         print(f"[SCAN] QR Code detected: {qr_data}")
         
-        # Start processing time measurement
-        import time
-        start_time = time.time()
+        # Start processing time measurement (monotonic - immune to NTP steps)
+        start_ns = time.monotonic_ns()
         
         # Validate ticket
         validation_result = self.validate_ticket(qr_data)
         
         # Calculate processing time
-        processing_time = time.time() - start_time
+        processing_ns = time.monotonic_ns() - start_ns
+        processing_time = processing_ns / 1e9
+        
+        # Scan counts changed - force the waiting screen to re-read them
+        self._stats_cache_ts = 0.0
         
         # Get today's scan count and database statistics
-        today_scans = self.db.get_today_scans()
-        db_stats = self.db.get_stats()
+        today_scans, db_stats = self._hud_stats()
         
         # Update connection status
         self.display.update_connection_status()
@@ -94,28 +140,41 @@ class AttractionCScanner:
             processing_ms = processing_time * 1000
             print(f"[SUCCESS] {validation_result['reason']} (Processed in {processing_ms:.1f}ms)")
             # Show success screen
-            success_screen = self.display.create_success_screen(
+            self.display.render_success(
                 validation_result['ticket_info'], today_scans, processing_time, db_stats
             )
-            self.display.show_screen(success_screen)
+            self.display.show_screen()
             
-            # Show success screen for 3 seconds
-            cv2.waitKey(3000)
+            # Keep success screen up for 3 seconds without blocking capture
+            self.display.hold_until = time.monotonic() + 3.0
         else:
             processing_ms = processing_time * 1000
             print(f"[ERROR] {validation_result['reason']} (Processed in {processing_ms:.1f}ms)")
             # Show error screen
-            error_screen = self.display.create_error_screen(
+            self.display.render_error(
                 validation_result['reason'], today_scans, processing_time, db_stats
             )
-            self.display.show_screen(error_screen)
+            self.display.show_screen()
             
-            # Show error screen for 3 seconds
-            cv2.waitKey(3000)
+            # Keep error screen up for 3 seconds without blocking capture
+            self.display.hold_until = time.monotonic() + 3.0
         
         # Mark scan time to prevent duplicate scans
         self.display.mark_scan_time()
     
+    def handle_key(self, key):
+        """Act on a key press; return False when the scanner should quit"""
+        if key == ord('q'):
+            print("[QUIT] Quitting scanner...")
+            return False
+        elif key == ord('r'):
+            print("[RESET] Reset scan cooldown")
+            self.display.reset_scan_cooldown()
+        elif key == ord('s'):
+            stats = self.db.get_stats()
+            print(f"📊 Stats: {stats}")
+        return True
+    
     def run(self):
         """Main application loop"""
         print("=" * 60)
@@ -131,20 +190,41 @@ class AttractionCScanner:
         
         print("[SCANNER] Starting QR scanner...")
         print("   - Point camera at QR code to scan")
-        print("   - Press 'q' to quit")
-        print("   - Press 'r' to reset scan cooldown")
-        print("   - Press 's' to show stats")
+        if self.display.framebuffer is None:
+            print("   - Press 'q' to quit")
+            print("   - Press 'r' to reset scan cooldown")
+            print("   - Press 's' to show stats")
+        else:
+            print("   - Press Ctrl+C to quit")
         
         try:
             while self.running:
-                # Read camera frame
-                ret, frame = self.camera.read()
-                if not ret:
-                    print("[ERROR] Failed to read camera frame")
-                    break
+                # Leave the result screen up while the grabber keeps draining the camera -
+                # one wait for the rest of the hold, still taking key presses
+                now = time.monotonic()
+                if now < self.display.hold_until:
+                    remaining = self.display.hold_until - now
+                    if self.display.framebuffer is not None:
+                        # No HighGUI window in framebuffer mode - no keys, just wait (Ctrl+C still quits)
+                        time.sleep(remaining)
+                        continue
+                    key = cv2.waitKey(max(1, int(remaining * 1000))) & 0xFF
+                    if not self.handle_key(key):
+                        break
+                    continue
+                
+                # Take the freshest frame from the grabber thread
+                frame = self.grabber.read_latest()
+                if frame is None:
+                    if self.grabber.failed:
+                        print("[ERROR] Failed to read camera frame")
+                        break
+                    continue
                 
-                # Resize frame for better performance
-                frame = cv2.resize(frame, (640, 480))
+                # Resize only if the driver ignored the requested 640x480
+                h, w = frame.shape[:2]
+                if (w, h) != (640, 480):
+                    frame = cv2.resize(frame, (640, 480), interpolation=cv2.INTER_AREA)
                 
                 # Check if we can scan (cooldown period)
                 if self.display.can_scan():
@@ -158,22 +238,14 @@ class AttractionCScanner:
                 # Show waiting screen
                 # Refresh connection status at a throttled cadence
                 self.display.maybe_update_connection_status()
-                today_scans = self.db.get_today_scans()
-                db_stats = self.db.get_stats()
-                waiting_screen = self.display.create_waiting_screen(today_scans, db_stats=db_stats)
-                self.display.show_screen(waiting_screen)
+                today_scans, db_stats = self._cached_stats()
+                self.display.request_waiting_screen(today_scans, db_stats=db_stats)
+                self.display.show_latest_screen()
                 
-                # Handle key presses
-                key = cv2.waitKey(1) & 0xFF
-                if key == ord('q'):
-                    print("[QUIT] Quitting scanner...")
+                # Handle key presses (non-blocking - the grabber already paces the loop);
+                # framebuffer mode has no window to take them
+                if self.display.framebuffer is None and not self.handle_key(cv2.pollKey() & 0xFF):
                     break
-                elif key == ord('r'):
-                    print("[RESET] Reset scan cooldown")
-                    self.display.last_scan_time = 0
-                elif key == ord('s'):
-                    stats = self.db.get_stats()
-                    print(f"📊 Stats: {stats}")
         
         except KeyboardInterrupt:
             print("\n🛑 Interrupted by user")
@@ -188,8 +260,12 @@ class AttractionCScanner:
     
     def cleanup(self):
         """Cleanup resources"""
+        if self.grabber:
+            self.grabber.stop()
         if self.camera:
             self.camera.release()
+        self.decoder.close()
+        self.db.close()
         self.display.cleanup()
         print("[CLEANUP] Cleanup completed")
 
@@ -4,33 +4,48 @@ Add Test Tickets for Performance Testing
 Adds 100,000 random tickets to Attraction C database
 """
 
-import random
 import string
 import time
+import numpy as np
+from datetime import datetime
 from ticket_database import TicketDatabase
 
-def generate_random_ticket():
-    """Generate a random ticket number and attractions"""
-    # Generate random ticket types with their corresponding attractions
-    ticket_types = [
-        ("TICKET_C", "C"),
-        ("TICKET_ABC", "A,B,C")
-    ]
-    
-    # Random ticket type
-    ticket_type, attractions = random.choice(ticket_types)
-    
-    # Random 3-digit number
-    ticket_num = f"{random.randint(1, 999):03d}"
-    
-    # Random person count (1-6 people)
-    person_count = random.randint(1, 6)
-    
-    # Random suffix
-    suffix = ''.join(random.choices(string.ascii_uppercase, k=2))
-    
-    ticket_no = f"{ticket_type}_{ticket_num}_{person_count}P_{suffix}"
-    return ticket_no, attractions
+ALPHABET = np.array(list(string.ascii_uppercase))
+
+def generate_random_tickets(count, rng=None):
+    """Generate a batch of random tickets as add_tickets_bulk rows"""
+    if rng is None:
+        rng = np.random.default_rng()
+    
+    # Draw every random field for the whole batch in one vectorized call each
+    types = rng.choice(np.array(["TICKET_C", "TICKET_ABC"]), size=count)
+    nums = rng.integers(1, 1000, size=count)
+    people = rng.integers(1, 7, size=count)
+    letters = rng.integers(0, 26, size=(count, 2))
+    suffixes = np.char.add(ALPHABET[letters[:, 0]], ALPHABET[letters[:, 1]])
+    persons_allowed = rng.integers(1, 7, size=count)
+    
+    # All test tickets are booked for today so they validate
+    booking_date = datetime.now().strftime("%Y-%m-%d")
+    
+    rows = []
+    for ticket_type, num, person_count, suffix, pax in zip(
+            types.tolist(), nums.tolist(), people.tolist(), suffixes.tolist(), persons_allowed.tolist()):
+        ticket_no = f"{ticket_type}_{num:03d}_{person_count}P_{suffix}"
+        ab_pax = pax if ticket_type == "TICKET_ABC" else 0
+        rows.append((ticket_no, booking_date, ticket_no, ab_pax, 0, ab_pax, 0, pax, 0))
+    return rows
+
+def iter_random_tickets(count, batch_size=1000, rng=None):
+    """Yield count random ticket rows, generated a vectorized batch at a time"""
+    if rng is None:
+        rng = np.random.default_rng()
+    
+    remaining = count
+    while remaining > 0:
+        batch = min(batch_size, remaining)
+        yield from generate_random_tickets(batch, rng)
+        remaining -= batch
 
 def add_test_tickets(attraction_name, count=100000):
     """Add test tickets to specified attraction database"""
@@ -43,61 +58,17 @@ def add_test_tickets(attraction_name, count=100000):
     # Start timing
     start_time = time.time()
     
-    # Generate and add tickets in batches for better performance
-    batch_size = 1000
-    total_batches = count // batch_size
-    remaining = count % batch_size
-    
-    print(f"📦 Processing {total_batches} batches of {batch_size} tickets each")
-    if remaining > 0:
-        print(f"📦 Plus 1 batch of {remaining} tickets")
+    print(f"📦 Streaming {count:,} tickets into a single bulk transaction")
     
     tickets_added = 0
     
     try:
-        for batch_num in range(total_batches):
-            batch_start = time.time()
-            
-            # Generate batch of tickets
-            batch_tickets = []
-            for i in range(batch_size):
-                ticket_no, attractions = generate_random_ticket()
-                persons_allowed = random.randint(1, 6)
-                batch_tickets.append((ticket_no, persons_allowed, attractions))
-            
-            # Add batch to database using bulk insert
-            success = db.add_tickets_bulk(batch_tickets)
-            if success:
-                tickets_added += len(batch_tickets)
-            else:
-                print(f"❌ Failed to add batch {batch_num + 1}")
-                break
-            
-            batch_time = time.time() - batch_start
-            batch_rate = batch_size / batch_time
-            
-            print(f"✅ Batch {batch_num + 1}/{total_batches}: {batch_size} tickets in {batch_time:.2f}s ({batch_rate:.1f} tickets/sec)")
-        
-        # Add remaining tickets if any
-        if remaining > 0:
-            batch_start = time.time()
-            
-            # Generate remaining tickets
-            remaining_tickets = []
-            for i in range(remaining):
-                ticket_no, attractions = generate_random_ticket()
-                persons_allowed = random.randint(1, 6)
-                remaining_tickets.append((ticket_no, persons_allowed, attractions))
-            
-            # Add remaining tickets using bulk insert
-            success = db.add_tickets_bulk(remaining_tickets)
-            if success:
-                tickets_added += len(remaining_tickets)
-            
-            batch_time = time.time() - batch_start
-            batch_rate = remaining / batch_time
-            
-            print(f"✅ Final batch: {remaining} tickets in {batch_time:.2f}s ({batch_rate:.1f} tickets/sec)")
+        # Rows are generated lazily and inserted in one transaction
+        success = db.add_tickets_bulk(iter_random_tickets(count))
+        if not success:
+            print("❌ Failed to add tickets")
+            return False
+        tickets_added = count
         
         # Calculate total statistics
         total_time = time.time() - start_time
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Camera Grabber for SOU Raspberry Pi
+Background capture thread that keeps only the freshest camera frame
+"""
+
+import os
+import threading
+
+class CameraGrabber:
+    """Continuously drains the camera into a single-slot latest-frame buffer"""
+
+    def __init__(self, camera, realtime_priority=20, cpu=3):
+        """Initialize grabber for an opened cv2.VideoCapture"""
+        self.camera = camera
+        self.realtime_priority = realtime_priority  # SCHED_FIFO priority (None to disable)
+        self.cpu = cpu  # Core to pin the capture thread to (None to disable)
+        self._latest = None
+        self._lock = threading.Lock()
+        self._new_frame = threading.Condition(self._lock)
+        self._thread = None
+        self.running = False
+        self.failed = False
+
+    def start(self):
+        """Start the background capture thread"""
+        self.running = True
+        self._thread = threading.Thread(target=self.run, name="CameraGrabber", daemon=True)
+        self._thread.start()
+
+    def set_realtime(self):
+        """Move the calling (capture) thread to SCHED_FIFO and pin it to its own core"""
+        # On Linux pid 0 means the calling thread, not the whole process
+        if self.realtime_priority is not None and hasattr(os, 'sched_setscheduler'):
+            try:
+                os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(self.realtime_priority))
+            except PermissionError:
+                print("[WARNING] Real-time capture scheduling needs CAP_SYS_NICE, using default scheduler")
+            except OSError as e:
+                print(f"[WARNING] Could not set real-time capture scheduling: {e}")
+
+        if self.cpu is not None and hasattr(os, 'sched_setaffinity'):
+            try:
+                if self.cpu in os.sched_getaffinity(0):
+                    os.sched_setaffinity(0, {self.cpu})
+            except OSError as e:
+                print(f"[WARNING] Could not pin capture thread to CPU {self.cpu}: {e}")
+
+    def run(self):
+        """Capture loop - overwrite the slot with every frame the driver delivers"""
+        self.set_realtime()
+
+        while self.running:
+            ret, frame = self.camera.read()
+            if not ret:
+                # Let the consumer notice the failure and shut down
+                self.failed = True
+                self.running = False
+                with self._new_frame:
+                    self._new_frame.notify_all()
+                break
+
+            with self._new_frame:
+                self._latest = frame
+                self._new_frame.notify()
+
+    def read_latest(self, timeout=0.1):
+        """Pop the freshest frame, waiting briefly for one (None if nothing new arrived)"""
+        with self._new_frame:
+            if self._latest is None and self.running:
+                self._new_frame.wait(timeout)
+            frame, self._latest = self._latest, None
+        return frame
+
+    def stop(self):
+        """Stop the capture thread and wait for it to exit"""
+        self.running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
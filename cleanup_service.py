@@ -6,13 +6,37 @@ Automatically cleans up old tickets and scan history every hour
 
 import sqlite3
 import os
-import time
+import json
+import signal
 import logging
-import shutil
+import threading
 from datetime import datetime, timedelta
 from config import config
 from ticket_database import TicketDatabase
 
+# Applied on every connection/attached schema - journal_mode is persistent, the rest are per-connection
+CONNECTION_PRAGMAS = (
+    'journal_mode=WAL',
+    'synchronous=NORMAL',
+    'temp_store=MEMORY',
+    'cache_size=-4000',
+    'mmap_size=268435456',
+)
+
+# Online backup copies this many pages per step, yielding to writers in between
+BACKUP_PAGES_PER_STEP = 200
+BACKUP_STEP_SLEEP = 0.01
+
+# Per-database signature of the last backup, used to skip copying unchanged databases
+BACKUP_STATE_FILE = os.path.join("backups", "backup_state.json")
+
+# Free pages returned to the filesystem per cleanup (incremental vacuum)
+INCREMENTAL_VACUUM_PAGES = 1000
+
+# Rows removed per DELETE statement - the write lock is released between chunks
+# so scanner inserts are not stalled behind one huge cleanup transaction
+DELETE_CHUNK_SIZE = 10000
+
 class CleanupService:
     """Hourly cleanup service for attraction databases"""
     
@@ -21,10 +45,13 @@ class CleanupService:
         self.setup_logging()
         self.attractions = ["AttractionA", "AttractionB", "AttractionC"]
         self.databases = {}
+        self._stop_event = threading.Event()
+        self._backup_state = self.load_backup_state()
         
         # Initialize databases for all attractions
         for attraction in self.attractions:
             self.databases[attraction] = TicketDatabase(attraction)
+            self.enable_incremental_vacuum(f"{attraction}.db")
         
         self.logger.info("Hourly Cleanup Service initialized")
     
@@ -40,22 +67,144 @@ class CleanupService:
         )
         self.logger = logging.getLogger('HourlyCleanupService')
     
-    def should_run_cleanup(self):
-        """Check if cleanup should run (every hour)"""
-        now = datetime.now()
-        current_time = now.time()
+    def _apply_pragmas(self, conn, schema='main'):
+        """Apply the tuned PRAGMAs to one schema of a connection"""
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(f'PRAGMA {schema}.{pragma}')
+    
+    def _connect(self, db_path, timeout=10.0):
+        """Open a database connection in WAL mode with the tuned PRAGMAs applied"""
+        # Autocommit mode - transactions are started explicitly
+        conn = sqlite3.connect(db_path, timeout=timeout, isolation_level=None)
+        self._apply_pragmas(conn)
+        return conn
+    
+    def _attach_all(self, timeout=10.0):
+        """Open one connection with every existing attraction database attached
+        
+        Returns:
+            (conn, schemas) - schemas maps attraction name to its attached schema name
+        """
+        conn = sqlite3.connect(':memory:', timeout=timeout, isolation_level=None)
+        schemas = {}
+        for attraction in self.attractions:
+            db_path = f"{attraction}.db"
+            if not os.path.exists(db_path):
+                continue
+            schema = attraction.lower()
+            conn.execute(f'ATTACH DATABASE ? AS {schema}', (db_path,))
+            self._apply_pragmas(conn, schema)
+            schemas[attraction] = schema
+        return conn, schemas
+    
+    def _count_rows(self, cursor, schema='main'):
+        """Return (tickets, scan_history) row counts in a single statement"""
+        cursor.execute(f'''
+            SELECT (SELECT COUNT(*) FROM {schema}.tickets),
+                   (SELECT COUNT(*) FROM {schema}.scan_history)
+        ''')
+        return cursor.fetchone()
+    
+    def _delete_in_chunks(self, conn, deletions):
+        """
+        Delete rows for each (table, where, params) chunk by chunk
         
-        # Check if it's the top of the hour (00:00-00:05 minutes)
-        # This ensures cleanup runs once per hour
-        return current_time.minute <= 5
+        Every round removes up to DELETE_CHUNK_SIZE rows from each table that still
+        has matches inside one transaction, so a normal hourly cleanup is a single
+        commit. The transaction is deferred: on a connection with every attraction
+        attached, BEGIN IMMEDIATE would write-lock all of them, while a deferred one
+        only locks the database its DELETEs touch. Returns the rows deleted per table.
+        """
+        deleted = [0] * len(deletions)
+        pending = list(range(len(deletions)))
+        while pending:
+            conn.execute('BEGIN')
+            try:
+                for i in list(pending):
+                    table, where, params = deletions[i]
+                    cursor = conn.execute(f'''
+                        DELETE FROM {table} WHERE rowid IN (
+                            SELECT rowid FROM {table} WHERE {where} LIMIT {DELETE_CHUNK_SIZE}
+                        )
+                    ''', params)
+                    deleted[i] += cursor.rowcount
+                    if cursor.rowcount < DELETE_CHUNK_SIZE:
+                        pending.remove(i)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return deleted
+    
+    def enable_incremental_vacuum(self, db_path):
+        """Switch an existing database to auto_vacuum=INCREMENTAL (one-time full VACUUM)"""
+        try:
+            conn = self._connect(db_path)
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                # The mode change only takes effect once the file is rebuilt
+                conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+                conn.execute('VACUUM')
+                self.logger.info("Enabled incremental vacuum for %s", db_path)
+            conn.close()
+        except sqlite3.Error as e:
+            self.logger.warning("Could not enable incremental vacuum for %s: %s", db_path, e)
+    
+    def is_full_vacuum_window(self):
+        """Full VACUUM only runs once a week (Monday, 03:00 cleanup)"""
+        now = datetime.now()
+        return now.weekday() == 0 and now.hour == 3
     
     def get_yesterday_date(self):
         """Get yesterday's date in YYYY-MM-DD format"""
         yesterday = datetime.now() - timedelta(days=1)
         return yesterday.strftime("%Y-%m-%d")
     
+    def load_backup_state(self):
+        """Load the last-backup signatures saved by a previous run"""
+        try:
+            with open(BACKUP_STATE_FILE, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def save_backup_state(self):
+        """Persist the last-backup signatures"""
+        try:
+            with open(BACKUP_STATE_FILE, 'w') as f:
+                json.dump(self._backup_state, f, indent=2)
+        except OSError as e:
+            self.logger.warning("Could not save backup state: %s", e)
+    
+    def database_signature(self, db_path):
+        """
+        Size and mtime of the database file, or None while its WAL still holds changes
+        
+        Taken right after the cleanup's wal_checkpoint(TRUNCATE), when the main file alone
+        holds the data. The WAL itself is left out - truncating it touches its mtime every cycle.
+        """
+        try:
+            if os.path.getsize(db_path + "-wal") > 0:
+                return None
+        except FileNotFoundError:
+            pass
+        st = os.stat(db_path)
+        return [st.st_mtime_ns, st.st_size]
+    
+    def link_unchanged_backup(self, db_path, signature, backup_path):
+        """Hardlink the previous backup if the database has not changed since; True on success"""
+        last = self._backup_state.get(db_path)
+        if signature is None or not last or last.get('signature') != signature or not os.path.exists(last.get('path', '')):
+            return False
+        try:
+            os.link(last['path'], backup_path)
+        except OSError as e:
+            self.logger.debug("Hardlinking backup failed, copying instead: %s", e)
+            return False
+        self.logger.info("Database unchanged, backup linked to: %s", backup_path)
+        return True
+    
     def backup_database(self, db_path):
-        """Create backup of database before cleanup"""
+        """Back up the database after cleanup (once the WAL has been checkpointed into it)"""
         try:
             backup_dir = "backups"
             if not os.path.exists(backup_dir):
@@ -64,86 +213,134 @@ class CleanupService:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             backup_path = os.path.join(backup_dir, f"{os.path.basename(db_path)}_backup_{timestamp}")
             
-            shutil.copy2(db_path, backup_path)
-            self.logger.info(f"Database backed up to: {backup_path}")
+            # Idle attraction - reuse the previous backup instead of rewriting identical bytes
+            signature = self.database_signature(db_path)
+            if self.link_unchanged_backup(db_path, signature, backup_path):
+                self.prune_backups(backup_dir, db_path)
+                return backup_path
+            
+            # SQLite online backup - a consistent snapshot even while scanners are writing
+            src = sqlite3.connect(db_path, timeout=10.0)
+            dst = sqlite3.connect(backup_path)
+            try:
+                src.backup(dst, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP)
+                dst.execute('PRAGMA journal_mode=DELETE')  # Standalone file, no -wal/-shm sidecars
+            finally:
+                dst.close()
+                src.close()
+            self.logger.info("Database backed up to: %s", backup_path)
+            
+            self._backup_state[db_path] = {'signature': signature, 'path': backup_path}
+            self.save_backup_state()
+            
+            self.prune_backups(backup_dir, db_path)
             return backup_path
             
         except Exception as e:
-            self.logger.error(f"Failed to backup database {db_path}: {e}")
+            self.logger.error("Failed to backup database %s: %s", db_path, e)
             return None
     
-    def cleanup_attraction_database(self, attraction_name):
-        """Clean up a single attraction database"""
+    def prune_backups(self, backup_dir, db_path):
+        """Delete this database's backups older than database.max_backups days
+        
+        Age comes from the timestamp in the file name - hardlinked backups of an idle
+        database share one inode, so their mtimes all move together.
+        """
+        cutoff = datetime.now() - timedelta(days=config.get('database.max_backups', 7))
+        prefix = f"{os.path.basename(db_path)}_backup_"
+        
+        for entry in os.scandir(backup_dir):
+            if not entry.name.startswith(prefix):
+                continue
+            try:
+                created = datetime.strptime(entry.name[len(prefix):], "%Y%m%d_%H%M%S")
+            except ValueError:
+                continue
+            try:
+                if created < cutoff:
+                    os.remove(entry.path)
+                    self.logger.info("Removed old backup: %s", entry.path)
+            except OSError as e:
+                self.logger.warning("Could not remove old backup %s: %s", entry.path, e)
+    
+    def cleanup_attraction_database(self, attraction_name, conn=None, schema='main'):
+        """Clean up a single attraction database (optionally through a shared attached connection)"""
         db_path = f"{attraction_name}.db"
         
         if not os.path.exists(db_path):
-            self.logger.warning(f"Database {db_path} not found, skipping...")
+            self.logger.warning("Database %s not found, skipping...", db_path)
             return False
         
         try:
-            # Create backup before cleanup
-            backup_path = self.backup_database(db_path)
-            if not backup_path:
-                self.logger.error(f"Failed to backup {attraction_name}, skipping cleanup")
-                return False
-            
-            conn = sqlite3.connect(db_path)
+            own_conn = conn is None
+            if own_conn:
+                conn = self._connect(db_path)
             cursor = conn.cursor()
             
             # Get yesterday's date
             yesterday = self.get_yesterday_date()
             
             # Count records before cleanup
-            cursor.execute('SELECT COUNT(*) FROM tickets')
-            tickets_before = cursor.fetchone()[0]
-            
-            cursor.execute('SELECT COUNT(*) FROM scan_history')
-            scans_before = cursor.fetchone()[0]
-            
-            # Clean up old tickets (from yesterday and earlier)
-            cursor.execute('''
-                DELETE FROM tickets 
-                WHERE booking_date <= ?
-            ''', (yesterday,))
-            tickets_deleted = cursor.rowcount
+            tickets_before, scans_before = self._count_rows(cursor, schema)
             
-            # Clean up old scan history (from yesterday and earlier)
-            cursor.execute('''
-                DELETE FROM scan_history 
-                WHERE DATE(scan_time) <= ?
-            ''', (yesterday,))
-            scans_deleted = cursor.rowcount
+            # Clean up old tickets and scan history (from yesterday and earlier).
+            # Tickets use idx_booking_date; comparing the raw scan_time against today's
+            # date keeps that predicate sargable for idx_scan_time
+            # ('YYYY-MM-DD HH:MM:SS' < 'YYYY-MM-DD' holds exactly for earlier days)
+            today = datetime.now().strftime("%Y-%m-%d")
+            tickets_deleted, scans_deleted = self._delete_in_chunks(conn, [
+                (f'{schema}.tickets', 'booking_date <= ?', (yesterday,)),
+                (f'{schema}.scan_history', 'scan_time < ?', (today,)),
+            ])
             
-            # Reset auto-increment counter for scan_history
-            cursor.execute('DELETE FROM sqlite_sequence WHERE name="scan_history"')
-            
-            conn.commit()
-            conn.close()
-            
-            # Vacuum database to reclaim space (must be done outside transaction)
+            # Reclaim space (must be done outside transaction). Hourly runs only release
+            # free pages and refresh planner stats; the full file rewrite is weekly
             try:
-                conn_vacuum = sqlite3.connect(db_path, timeout=5.0)
-                cursor_vacuum = conn_vacuum.cursor()
-                cursor_vacuum.execute('VACUUM')
-                conn_vacuum.close()
-                self.logger.info(f"   - Database vacuumed successfully")
+                if self.is_full_vacuum_window():
+                    # Flush the WAL into the main file first so VACUUM sees (and shrinks) everything
+                    cursor.execute(f'PRAGMA {schema}.wal_checkpoint(TRUNCATE)')
+                    cursor.execute(f'VACUUM {schema}')
+                    self.logger.info("   - Database vacuumed successfully")
+                else:
+                    # executescript steps the pragma to completion (execute() frees a single page)
+                    cursor.executescript(f'PRAGMA {schema}.incremental_vacuum({INCREMENTAL_VACUUM_PAGES});')
+                    cursor.execute(f'PRAGMA {schema}.optimize')
+                    self.logger.info("   - Incremental vacuum completed")
             except sqlite3.OperationalError as e:
                 if "database is locked" in str(e).lower():
-                    self.logger.warning(f"   - Database locked (possibly by HeidiSQL), skipping vacuum")
+                    self.logger.warning("   - Database locked (possibly by HeidiSQL), skipping vacuum")
                 else:
-                    self.logger.warning(f"   - Vacuum failed: {e}")
+                    self.logger.warning("   - Vacuum failed: %s", e)
             except Exception as e:
-                self.logger.warning(f"   - Vacuum failed: {e}")
+                self.logger.warning("   - Vacuum failed: %s", e)
+            
+            # Fold the WAL into the main file so the backup copies the small, cleaned-up
+            # database (the previous cycle's backup still holds the rows just deleted)
+            try:
+                cursor.execute(f'PRAGMA {schema}.wal_checkpoint(TRUNCATE)')
+            except sqlite3.OperationalError as e:
+                self.logger.warning("   - WAL checkpoint failed: %s", e)
+            
+            if own_conn:
+                conn.close()
+            
+            backup_path = self.backup_database(db_path)
+            if not backup_path:
+                self.logger.error("Failed to backup %s after cleanup", attraction_name)
+                return False
             
-            self.logger.info(f"[SUCCESS] {attraction_name} cleanup completed:")
-            self.logger.info(f"   - Tickets before: {tickets_before}, deleted: {tickets_deleted}")
-            self.logger.info(f"   - Scans before: {scans_before}, deleted: {scans_deleted}")
-            self.logger.info(f"   - Backup created: {backup_path}")
+            self.logger.info(
+                "[SUCCESS] %s cleanup completed:\n"
+                "   - Tickets before: %s, deleted: %s\n"
+                "   - Scans before: %s, deleted: %s\n"
+                "   - Backup created: %s",
+                attraction_name, tickets_before, tickets_deleted,
+                scans_before, scans_deleted, backup_path)
             
             return True
             
         except Exception as e:
-            self.logger.error(f"[ERROR] Error cleaning up {attraction_name}: {e}")
+            self.logger.error("[ERROR] Error cleaning up %s: %s", attraction_name, e)
             return False
     
     def cleanup_all_databases(self):
@@ -153,14 +350,27 @@ class CleanupService:
         success_count = 0
         total_count = len(self.attractions)
         
-        for attraction in self.attractions:
-            if self.cleanup_attraction_database(attraction):
-                success_count += 1
+        # One connection for the whole cycle instead of one (plus a vacuum one) per attraction
+        try:
+            conn, schemas = self._attach_all()
+        except sqlite3.Error as e:
+            self.logger.error("[ERROR] Could not open attraction databases: %s", e)
+            return False
+        
+        try:
+            for attraction in self.attractions:
+                if attraction not in schemas:
+                    self.logger.warning("Database %s.db not found, skipping...", attraction)
+                    continue
+                if self.cleanup_attraction_database(attraction, conn, schemas[attraction]):
+                    success_count += 1
+        finally:
+            conn.close()
         
         if success_count == total_count:
-            self.logger.info(f"[SUCCESS] Hourly cleanup completed successfully for all {total_count} databases")
+            self.logger.info("[SUCCESS] Hourly cleanup completed successfully for all %s databases", total_count)
         else:
-            self.logger.warning(f"[WARNING] Hourly cleanup completed with issues: {success_count}/{total_count} databases cleaned")
+            self.logger.warning("[WARNING] Hourly cleanup completed with issues: %s/%s databases cleaned", success_count, total_count)
         
         return success_count == total_count
     
@@ -168,23 +378,22 @@ class CleanupService:
         """Get statistics about database sizes before cleanup"""
         stats = {}
         
+        try:
+            conn, schemas = self._attach_all()
+        except sqlite3.Error as e:
+            self.logger.error("Error opening databases for stats: %s", e)
+            return {attraction: {'error': str(e)} for attraction in self.attractions}
+        
         for attraction in self.attractions:
-            db_path = f"{attraction}.db"
-            if os.path.exists(db_path):
+            schema = schemas.get(attraction)
+            if schema is not None:
                 try:
-                    conn = sqlite3.connect(db_path, timeout=10.0)
                     cursor = conn.cursor()
                     
-                    cursor.execute('SELECT COUNT(*) FROM tickets')
-                    ticket_count = cursor.fetchone()[0]
-                    
-                    cursor.execute('SELECT COUNT(*) FROM scan_history')
-                    scan_count = cursor.fetchone()[0]
+                    ticket_count, scan_count = self._count_rows(cursor, schema)
                     
                     # Get database file size
-                    file_size = os.path.getsize(db_path)
-                    
-                    conn.close()
+                    file_size = os.path.getsize(f"{attraction}.db")
                     
                     stats[attraction] = {
                         'tickets': ticket_count,
@@ -193,62 +402,89 @@ class CleanupService:
                     }
                     
                 except Exception as e:
-                    self.logger.error(f"Error getting stats for {attraction}: {e}")
+                    self.logger.error("Error getting stats for %s: %s", attraction, e)
                     stats[attraction] = {'error': str(e)}
             else:
                 stats[attraction] = {'error': 'Database not found'}
         
+        conn.close()
         return stats
     
+    def get_database_sizes(self):
+        """Get database file sizes in MB (a stat per file, no queries)"""
+        sizes = {}
+        for attraction in self.attractions:
+            try:
+                sizes[attraction] = round(os.path.getsize(f"{attraction}.db") / (1024 * 1024), 2)
+            except OSError:
+                pass
+        return sizes
+    
     def run_cleanup_cycle(self):
         """Run a single cleanup cycle"""
         self.logger.info("[CLEANUP] Starting cleanup cycle...")
         
-        # Get stats before cleanup
-        stats_before = self.get_cleanup_stats()
-        self.logger.info(f"Database stats before cleanup: {stats_before}")
+        # Full row-count stats cost a table scan per table - only gather them when debugging
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            stats_before = self.get_cleanup_stats()
+            self.logger.debug("Database stats before cleanup: %s", stats_before)
+        sizes_before = self.get_database_sizes()
         
         # Perform cleanup
         success = self.cleanup_all_databases()
         
-        # Get stats after cleanup
-        stats_after = self.get_cleanup_stats()
-        self.logger.info(f"Database stats after cleanup: {stats_after}")
+        if debug:
+            stats_after = self.get_cleanup_stats()
+            self.logger.debug("Database stats after cleanup: %s", stats_after)
+        sizes_after = self.get_database_sizes()
+        
+        for attraction in self.attractions:
+            if attraction in sizes_before and attraction in sizes_after:
+                self.logger.info("%s size: %s MB -> %s MB", attraction, sizes_before[attraction], sizes_after[attraction])
         
         return success
     
+    def next_run_time(self):
+        """Top of the next hour"""
+        return datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    
+    def _handle_sigterm(self, signum, frame):
+        """Stop the service loop on SIGTERM"""
+        self.logger.info("[CLEANUP] Termination signal received, stopping...")
+        self._stop_event.set()
+    
     def run(self):
-        """Main service loop"""
+        """Main service loop - sleeps until the top of each hour, then cleans up"""
         self.logger.info("[CLEANUP] Hourly Cleanup Service started")
         
-        # Check interval (in seconds) - check every minute
-        check_interval = 60
+        # Signal handlers can only be installed from the main thread
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self._handle_sigterm)
         
-        while True:
+        next_run = self.next_run_time()
+        
+        while not self._stop_event.is_set():
             try:
-                if self.should_run_cleanup():
-                    self.logger.info("[CLEANUP] Hourly cleanup time detected")
-                    self.run_cleanup_cycle()
-                    
-                    # Wait until after cleanup window to avoid multiple runs
-                    self.logger.info("[CLEANUP] Waiting until after cleanup window...")
-                    time.sleep(300)  # Wait 5 minutes
-                else:
-                    # Log current time and next cleanup time
-                    now = datetime.now()
-                    next_cleanup = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
-                    
-                    time_until_cleanup = next_cleanup - now
-                    self.logger.debug(f"Next cleanup in {time_until_cleanup}")
+                delay = (next_run - datetime.now()).total_seconds()
+                if delay > 0:
+                    self.logger.debug("Next cleanup in %s", timedelta(seconds=int(delay)))
+                    # Re-check the clock after waking (early wakeups, clock steps)
+                    self._stop_event.wait(delay)
+                    continue
                 
-                time.sleep(check_interval)
+                self.logger.info("[CLEANUP] Hourly cleanup time detected")
+                self.run_cleanup_cycle()
+                next_run = self.next_run_time()
                 
             except KeyboardInterrupt:
                 self.logger.info("[CLEANUP] Hourly Cleanup Service stopped by user")
                 break
             except Exception as e:
-                self.logger.error(f"Unexpected error in cleanup service: {e}")
-                time.sleep(check_interval)
+                self.logger.error("Unexpected error in cleanup service: %s", e)
+                next_run = self.next_run_time()
+        
+        self.logger.info("[CLEANUP] Hourly Cleanup Service stopped")
 
 def main():
     """Main entry point for hourly cleanup service"""
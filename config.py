@@ -6,8 +6,19 @@ Handles all configuration settings for the system
 
 import os
 import json
+import atexit
+import threading
+from functools import lru_cache
 from typing import Dict, Any
 
+try:
+    import orjson  # Faster parse/serialize when available
+except ImportError:
+    orjson = None
+
+# Config.set() batches writes: config.json is saved this long after the last change
+SAVE_DELAY_SECONDS = 1.0
+
 class Config:
     """Configuration manager for SOU system"""
     
@@ -15,13 +26,33 @@ class Config:
         """Initialize configuration"""
         self.config_file = config_file
         self.config = self.load_config()
+        self._flat = self._flatten(self.config)
+        # Derived URLs are rebuilt only after a config change
+        self._api_url_cached = lru_cache(maxsize=16)(self._build_api_url)
+        
+        # Pending (debounced) save state
+        self._dirty = False
+        self._save_timer = None
+        self._save_lock = threading.Lock()
+        atexit.register(self.flush)
+    
+    def _flatten(self, tree: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+        """Map every dot path (including intermediate sections) to its value"""
+        flat = {}
+        for key, value in tree.items():
+            path = prefix + key
+            flat[path] = value
+            if isinstance(value, dict):
+                flat.update(self._flatten(value, path + "."))
+        return flat
     
     def load_config(self) -> Dict[str, Any]:
         """Load configuration from file or create default"""
         if os.path.exists(self.config_file):
             try:
-                with open(self.config_file, 'r') as f:
-                    return json.load(f)
+                with open(self.config_file, 'rb') as f:
+                    data = f.read()
+                return orjson.loads(data) if orjson else json.loads(data)
             except Exception as e:
                 print(f"⚠️  Error loading config file: {e}")
                 print("Using default configuration")
@@ -73,22 +104,18 @@ class Config:
             config = self.config
         
         try:
-            with open(self.config_file, 'w') as f:
-                json.dump(config, f, indent=2)
+            if orjson:
+                with open(self.config_file, 'wb') as f:
+                    f.write(orjson.dumps(config, option=orjson.OPT_INDENT_2))
+            else:
+                with open(self.config_file, 'w') as f:
+                    json.dump(config, f, indent=2)
         except Exception as e:
             print(f"❌ Error saving config file: {e}")
     
     def get(self, key_path: str, default=None):
         """Get configuration value using dot notation (e.g., 'api.base_url')"""
-        keys = key_path.split('.')
-        value = self.config
-        
-        try:
-            for key in keys:
-                value = value[key]
-            return value
-        except (KeyError, TypeError):
-            return default
+        return self._flat.get(key_path, default)
     
     def set(self, key_path: str, value: Any):
         """Set configuration value using dot notation"""
@@ -103,10 +130,34 @@ class Config:
         
         # Set the value
         config[keys[-1]] = value
+        self._flat = self._flatten(self.config)
+        self._api_url_cached.cache_clear()
+        
+        # Coalesce bursts of set() calls into a single write
+        with self._save_lock:
+            self._dirty = True
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(SAVE_DELAY_SECONDS, self.flush)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+    
+    def flush(self):
+        """Write pending set() changes to the config file now"""
+        with self._save_lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if not self._dirty:
+                return
+            self._dirty = False
         self.save_config()
     
     def get_api_url(self, endpoint: str = None) -> str:
         """Get full API URL for an endpoint"""
+        return self._api_url_cached(endpoint)
+    
+    def _build_api_url(self, endpoint: str = None) -> str:
+        """Build full API URL for an endpoint (uncached)"""
         base_url = self.get('api.base_url', 'http://somewhere.com/SOU/')
         if not base_url.endswith('/'):
             base_url += '/'
@@ -125,5 +176,15 @@ class Config:
         endpoint = self.get('api.sync_endpoint', 'sync')
         return self.get_api_url(endpoint)
 
-# Global config instance
-config = Config()
+# Global config instance, created on first access so importing this module
+# does not parse config.json
+_config = None
+
+def __getattr__(name):
+    """Lazily create the global config instance"""
+    global _config
+    if name == 'config':
+        if _config is None:
+            _config = Config()
+        return _config
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -4,24 +4,62 @@ Debug script to help diagnose sync issues on the Raspberry Pi
 Run this on the Pi to check the sync status of tickets
 """
 
+import os
 import sqlite3
-from ticket_database import TicketDatabase
+from ticket_database import TicketDatabase, attraction_short_name
+
+ATTRACTIONS = ["AttractionA", "AttractionB", "AttractionC"]
+
+def attach_databases():
+    """Open one connection with every existing attraction database attached
+    
+    Returns:
+        (conn, schemas) - schemas maps attraction name to its attached schema name
+    """
+    conn = sqlite3.connect(':memory:')
+    schemas = {}
+    for attraction in ATTRACTIONS:
+        db_path = f"{attraction}.db"
+        if os.path.exists(db_path):
+            schema = attraction.lower()
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (db_path,))
+            schemas[attraction] = schema
+    return conn, schemas
+
+def find_ticket(conn, schemas, ticket_no):
+    """Check which attraction databases contain a ticket (one query for all of them)"""
+    if not schemas:
+        return {}
+    query = " UNION ALL ".join(
+        f"SELECT ?, EXISTS(SELECT 1 FROM {schema}.tickets WHERE ticket_no = ?)"
+        for schema in schemas.values()
+    )
+    params = []
+    for attraction in schemas:
+        params.extend((attraction, ticket_no))
+    return {attraction: bool(exists) for attraction, exists in conn.execute(query, params)}
 
 def debug_ticket_sync_status(ticket_no):
     """Debug the sync status of a specific ticket"""
     print(f"=== Debugging ticket: {ticket_no} ===")
     
-    attractions = ["AttractionA", "AttractionB", "AttractionC"]
+    conn, schemas = attach_databases()
+    found = find_ticket(conn, schemas, ticket_no)
+    conn.close()
     
-    for attraction in attractions:
+    for attraction in ATTRACTIONS:
         print(f"\n--- {attraction} ---")
-        db = TicketDatabase(attraction)
+        if attraction not in schemas:
+            print("Database not found")
+            continue
         
         # Check if ticket exists
-        exists = db.ticket_exists(ticket_no)
+        exists = found[attraction]
         print(f"Ticket exists: {exists}")
         
         if exists:
+            db = TicketDatabase(attraction)
+            
             # Get ticket info
             info = db.get_ticket_info(ticket_no)
             print(f"Ticket info: {info}")
@@ -38,24 +76,52 @@ def debug_ticket_sync_status(ticket_no):
             # Check status after marking
             info_after = db.get_ticket_info(ticket_no)
             print(f"Ticket info after marking: {info_after}")
+            db.close()
 
 def check_all_unsynced_tickets():
     """Check all unsynced tickets across all databases"""
     print("=== All Unsynced Tickets ===")
     
-    attractions = ["AttractionA", "AttractionB", "AttractionC"]
+    conn, schemas = attach_databases()
+    if not schemas:
+        print("No attraction databases found")
+        conn.close()
+        return
     
-    for attraction in attractions:
+    # Unsynced tickets from every database in one statement
+    unsynced = {attraction: [] for attraction in schemas}
+    query = " UNION ALL ".join(
+        f"SELECT * FROM (SELECT ?, ticket_no FROM {schema}.tickets WHERE is_synced = 0 "
+        f"ORDER BY last_scan ASC, created_at ASC)"
+        for schema in schemas.values()
+    )
+    for attraction, ticket_no in conn.execute(query, list(schemas)):
+        unsynced[attraction].append(ticket_no)
+    
+    # Per-database counters, also in one statement
+    query = " UNION ALL ".join(
+        f"SELECT ?, (SELECT COUNT(*) FROM {schema}.tickets), "
+        f"(SELECT COUNT(*) FROM {schema}.scan_history "
+        f"WHERE scan_time >= DATE('now') AND scan_time < DATE('now', '+1 day')), "
+        f"(SELECT COALESCE(SUM({attraction_short_name(attraction)}_used), 0) FROM {schema}.tickets "
+        f"WHERE DATE(last_scan) = DATE('now')), "
+        f"(SELECT COUNT(*) FROM {schema}.tickets WHERE is_synced = 0)"
+        for attraction, schema in schemas.items()
+    )
+    stats = {
+        attraction: {'total_tickets': total, 'today_scans': today, 'today_entries': entries,
+                     'unsynced_count': pending, 'attraction_name': attraction}
+        for attraction, total, today, entries, pending in conn.execute(query, list(schemas))
+    }
+    conn.close()
+    
+    for attraction in ATTRACTIONS:
         print(f"\n--- {attraction} ---")
-        db = TicketDatabase(attraction)
-        
-        # Get unsynced tickets
-        unsynced = db.get_unsynced_tickets()
-        print(f"Unsynced tickets: {unsynced}")
-        
-        # Get stats
-        stats = db.get_stats()
-        print(f"Database stats: {stats}")
+        if attraction not in schemas:
+            print("Database not found")
+            continue
+        print(f"Unsynced tickets: {unsynced[attraction]}")
+        print(f"Database stats: {stats[attraction]}")
 
 def test_mark_synced_functionality():
     """Test the mark_synced functionality"""
@@ -64,14 +130,16 @@ def test_mark_synced_functionality():
     # Test with a known ticket
     test_ticket = "20251010-000006"
     
-    attractions = ["AttractionA", "AttractionB", "AttractionC"]
+    conn, schemas = attach_databases()
+    found = find_ticket(conn, schemas, test_ticket)
+    conn.close()
     
-    for attraction in attractions:
+    for attraction in ATTRACTIONS:
         print(f"\n--- Testing {attraction} ---")
-        db = TicketDatabase(attraction)
         
-        if db.ticket_exists(test_ticket):
+        if found.get(attraction):
             print(f"Found ticket {test_ticket} in {attraction}")
+            db = TicketDatabase(attraction)
             
             # Get current status
             info = db.get_ticket_info(test_ticket)
@@ -84,6 +152,7 @@ def test_mark_synced_functionality():
             # Check status after
             info_after = db.get_ticket_info(test_ticket)
             print(f"After marking is_synced: {info_after['is_synced'] if info_after else 'N/A'}")
+            db.close()
         else:
             print(f"Ticket {test_ticket} not found in {attraction}")
 
@@ -6,44 +6,344 @@ Handles fullscreen display with QR scanning interface
 
 import cv2
 import numpy as np
+import os
 import time
+import threading
 import requests
+from collections import OrderedDict
 from datetime import datetime
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
+REASON_LAYOUT_CACHE_SIZE = 32  # Distinct error reasons kept laid out
+REASON_WRAP_WIDTH = 540  # Error reasons wider than this (px, ~30 chars) go on two lines
+STATUS_AREA = np.s_[860:1080, :]  # Rows covered by add_status_info
+CONNECTIVITY_CHECK_URL = "http://connectivitycheck.gstatic.com/generate_204"  # Empty 204 reply
+
+class DisplayWorker:
+    """Composes screens on a background thread from the most recently requested state"""
+    
+    def __init__(self, shape=(1080, 1920, 3)):
+        """Initialize display worker"""
+        self._lock = threading.Lock()  # Held only to swap the slots, never while rendering
+        self._wake = threading.Event()
+        self._next_frame_payload = None
+        self._ready_screen = None
+        # Two reused frame buffers: one may be on screen while the other is composed
+        self._buffers = [np.empty(shape, dtype=np.uint8) for _ in range(2)]
+        self._shown = None
+        self._thread = None
+        self.running = False
+    
+    def start(self):
+        """Start the composition thread"""
+        if self.running:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self.run, name="DisplayWorker", daemon=True)
+        self._thread.start()
+    
+    def submit(self, builder, *args, **kwargs):
+        """Request a screen; replaces any request that has not been rendered yet"""
+        with self._lock:
+            self._next_frame_payload = (builder, args, kwargs)
+        self._wake.set()
+    
+    def take_screen(self):
+        """Pop the newest composed screen (None if nothing new since the last call)"""
+        with self._lock:
+            screen, self._ready_screen = self._ready_screen, None
+            if screen is not None:
+                self._shown = screen
+        return screen
+    
+    def run(self):
+        """Composition loop"""
+        while self.running:
+            self._wake.wait(0.5)
+            self._wake.clear()
+            
+            with self._lock:
+                payload, self._next_frame_payload = self._next_frame_payload, None
+                if payload is None:
+                    continue
+                # Never draw into the buffer handed out last; an untaken ready
+                # screen is about to be superseded anyway
+                out = self._buffers[1] if self._buffers[0] is self._shown else self._buffers[0]
+                if self._ready_screen is out:
+                    self._ready_screen = None
+            
+            builder, args, kwargs = payload
+            try:
+                builder(*args, out=out, **kwargs)
+            except Exception as e:
+                print(f"[ERROR] Error composing screen: {e}")
+                continue
+            
+            with self._lock:
+                self._ready_screen = out
+    
+    def stop(self):
+        """Stop the composition thread"""
+        self.running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+class GlyphAtlas:
+    """Pre-rendered Hershey glyphs of one font/scale/thickness/color, blitted instead of putText"""
+    
+    def __init__(self, font, font_scale, thickness, color):
+        """Render every printable ASCII character once"""
+        self.glyphs = {}
+        pad = thickness + 2
+        (_, ascent), descent = cv2.getTextSize("".join(map(chr, range(32, 127))), font, font_scale, thickness)
+        
+        for code in range(32, 127):
+            ch = chr(code)
+            (width, _), _ = cv2.getTextSize(ch, font, font_scale, thickness)
+            (pair_width, _), _ = cv2.getTextSize(ch * 2, font, font_scale, thickness)
+            advance = pair_width - width  # Pen advance, without getTextSize's stroke padding
+            
+            cell = np.zeros((ascent + descent + 2 * pad, width + 2 * pad, 3), dtype=np.uint8)
+            origin = (pad, pad + ascent)
+            cv2.putText(cell, ch, origin, font, font_scale, color, thickness)
+            
+            # Keep only the inked pixels, positioned relative to the pen (baseline origin)
+            ys, xs = np.nonzero(cell.any(axis=2))
+            if len(xs) == 0:
+                self.glyphs[ch] = (None, 0, 0, advance)
+                continue
+            x0, x1, y0, y1 = xs.min(), xs.max() + 1, ys.min(), ys.max() + 1
+            sprite = np.ascontiguousarray(cell[y0:y1, x0:x1])
+            self.glyphs[ch] = (sprite, x0 - origin[0], y0 - origin[1], advance)
+        
+        if numba is not None:
+            self._pack()
+    
+    def _pack(self):
+        """Pack the glyphs into one sprite sheet plus a metrics table for the JIT blitter"""
+        sprites = [self.glyphs[chr(code)][0] for code in range(32, 127)]
+        sheet_h = max(s.shape[0] for s in sprites if s is not None)
+        sheet_w = sum(s.shape[1] for s in sprites if s is not None)
+        self.sheet = np.zeros((sheet_h, sheet_w, 3), dtype=np.uint8)
+        # Per glyph: sheet x, width, height, dx, dy, advance
+        self.metrics = np.zeros((95, 6), dtype=np.int64)
+        
+        sheet_x = 0
+        for index, code in enumerate(range(32, 127)):
+            sprite, dx, dy, advance = self.glyphs[chr(code)]
+            if sprite is None:
+                self.metrics[index] = (0, 0, 0, 0, 0, advance)
+                continue
+            h, w = sprite.shape[:2]
+            self.sheet[:h, sheet_x:sheet_x + w] = sprite
+            self.metrics[index] = (sheet_x, w, h, dx, dy, advance)
+            sheet_x += w
+        
+        # Byte -> glyph index, with anything unprintable drawn as '?'
+        self.code_map = np.full(256, ord('?') - 32, dtype=np.int64)
+        self.code_map[32:127] = np.arange(95)
+    
+    def draw(self, screen, text, org):
+        """Draw text with its baseline-left corner at org (same placement as cv2.putText)"""
+        if numba is not None:
+            codes = self.code_map[np.frombuffer(text.encode('ascii', 'replace'), dtype=np.uint8)]
+            _draw_glyphs(screen, self.sheet, self.metrics, codes, org[0], org[1])
+            return
+        
+        x, y = org
+        screen_h, screen_w = screen.shape[:2]
+        for ch in text:
+            glyph = self.glyphs.get(ch) or self.glyphs['?']
+            sprite, dx, dy, advance = glyph
+            if sprite is not None:
+                h, w = sprite.shape[:2]
+                gx, gy = x + dx, y + dy
+                # Clip to the screen
+                sx0, sy0 = max(0, -gx), max(0, -gy)
+                sx1, sy1 = min(w, screen_w - gx), min(h, screen_h - gy)
+                if sx1 > sx0 and sy1 > sy0:
+                    roi = screen[gy + sy0:gy + sy1, gx + sx0:gx + sx1]
+                    # Overlay ink onto the (black) status area - max, not a saturating
+                    # add, so strokes shared by neighbouring glyphs keep their color
+                    cv2.max(roi, sprite[sy0:sy1, sx0:sx1], dst=roi)
+            x += advance
+
+class FramebufferDisplay:
+    """Writes frames straight into the Linux framebuffer (/dev/fb0) without a window system"""
+    
+    # Framebuffer depth -> conversion from the BGR canvas
+    CONVERSIONS = {16: (cv2.COLOR_BGR2BGR565, 2), 32: (cv2.COLOR_BGR2BGRA, 4)}
+    
+    def __init__(self, device, width, height, bits_per_pixel, stride):
+        """Map the framebuffer device"""
+        self.conversion, channels = self.CONVERSIONS[bits_per_pixel]
+        self._map = np.memmap(device, dtype=np.uint8, mode='r+', shape=(height, stride))
+        self.pixels = self._map[:, :width * channels].reshape(height, width, channels)
+        # Rows padded to the stride can't be a cvtColor destination - convert, then copy
+        self._staging = None if self.pixels.flags.c_contiguous else np.empty_like(self.pixels)
+    
+    @classmethod
+    def open(cls, width, height, device='/dev/fb0'):
+        """Open the framebuffer if it matches the canvas size, else None"""
+        sysfs = os.path.join('/sys/class/graphics', os.path.basename(device))
+        try:
+            with open(os.path.join(sysfs, 'virtual_size')) as f:
+                fb_width, fb_height = (int(v) for v in f.read().split(','))
+            with open(os.path.join(sysfs, 'bits_per_pixel')) as f:
+                bits_per_pixel = int(f.read())
+            with open(os.path.join(sysfs, 'stride')) as f:
+                stride = int(f.read())
+        except (OSError, ValueError):
+            return None
+        
+        if (fb_width, fb_height) != (width, height) or bits_per_pixel not in cls.CONVERSIONS:
+            print(f"[WARNING] Framebuffer is {fb_width}x{fb_height} @ {bits_per_pixel} bpp, using a window instead")
+            return None
+        try:
+            return cls(device, width, height, bits_per_pixel, stride)
+        except OSError as e:
+            print(f"[WARNING] Could not map {device}: {e}")
+            return None
+    
+    def show(self, screen):
+        """Convert a BGR frame into the framebuffer's pixel format in place"""
+        if self._staging is None:
+            cv2.cvtColor(screen, self.conversion, dst=self.pixels)
+        else:
+            cv2.cvtColor(screen, self.conversion, dst=self._staging)
+            self.pixels[...] = self._staging
+    
+    def close(self):
+        """Unmap the framebuffer"""
+        self._map.flush()
+        self.pixels = self._map = None
+
+if numba is not None:
+    @numba.njit(cache=True)
+    def _draw_glyphs(screen, sheet, metrics, codes, x, y):
+        """Max-blend a run of atlas glyphs into the screen in one native call"""
+        screen_h, screen_w = screen.shape[0], screen.shape[1]
+        for i in range(codes.shape[0]):
+            g = codes[i]
+            sheet_x, w, h = metrics[g, 0], metrics[g, 1], metrics[g, 2]
+            gx, gy = x + metrics[g, 3], y + metrics[g, 4]
+            for r in range(h):
+                sy = gy + r
+                if sy < 0 or sy >= screen_h:
+                    continue
+                for c in range(w):
+                    sx = gx + c
+                    if sx < 0 or sx >= screen_w:
+                        continue
+                    for ch in range(3):
+                        value = sheet[r, sheet_x + c, ch]
+                        if value > screen[sy, sx, ch]:
+                            screen[sy, sx, ch] = value
+            x += metrics[g, 5]
+
 class DisplayManager:
     def __init__(self, attraction_name):
         """Initialize display manager"""
         self.attraction_name = attraction_name
         self.window_name = f"SOU Gate: {attraction_name} - QR Scanner"
-        self.is_online = self.check_internet_connection()
-        self.last_scan_time = 0
+        self.is_online = False  # Set by the connectivity thread
+        self.last_scan_time = float('-inf')  # Monotonic time of the last scan
         self.scan_cooldown = 3.0  # 3 seconds cooldown
-        # Throttled connection status checks
-        self.last_status_check_time = 0.0
+        self.hold_until = 0  # Monotonic deadline for the current result screen
+        # Connection status is checked on a background thread, never on the UI path
         try:
             from config import config
             self.status_check_interval = float(config.get('services.status_check_interval', 5))
         except Exception:
             self.status_check_interval = 5.0
+        self._session = requests.Session()
+        self._connectivity_stop = threading.Event()
+        self._connectivity_wake = threading.Event()
+        self._connectivity_thread = threading.Thread(target=self._connectivity_loop,
+                                                     name="Connectivity", daemon=True)
+        self._connectivity_thread.start()
+        # Set by setup_fullscreen when drawing to /dev/fb0 instead of a window
+        self.framebuffer = None
+        # Waiting screen is composed off the scan loop
+        self.worker = DisplayWorker()
+        
+        # Error reasons repeat, so their line split and centering are cached
+        self._reason_layouts = OrderedDict()
+        self._reason_advances = self._char_advances(cv2.FONT_HERSHEY_SIMPLEX, 1.2, 2)
+        
+        # Status text glyphs per color, rendered on first use
+        self._atlases = {}
+        
+        # Outlined titles are rasterized once and shared by the screens that use them
+        self._gate_title_sprite = self.render_title_sprite(f"SOU Gate: {attraction_name}")
+        self._title_sprite = self.render_title_sprite(f"SOU {attraction_name}")
+        
+        # Cached date/time strings for the current second
+        self._clock = (None, "", "")
+        
+        # Screen state each reused frame buffer currently holds (keyed by buffer id)
+        self._screen_state = {}
+        
+        # Result screens are composed in place into one reused frame buffer
+        self._scratch = np.empty((1080, 1920, 3), dtype=np.uint8)
+        
+        # Static parts of each screen are rendered once; frames only add dynamic text
+        self._backgrounds = {
+            'waiting': self._build_waiting_background(),
+            'success': self._build_success_background(),
+            'error': self._build_error_background(),
+        }
         
     def check_internet_connection(self):
-        """Check if device is online"""
+        """Check if device is online (HEAD probe over a kept-alive session)"""
         try:
-            requests.get("http://www.google.com", timeout=3)
-            return True
-        except:
+            response = self._session.head(CONNECTIVITY_CHECK_URL, timeout=1, allow_redirects=False)
+            # Captive portals answer with a redirect or a page instead of 204
+            return response.status_code == 204
+        except requests.RequestException:
             return False
     
-    def create_waiting_screen(self, today_scans=0, db_stats=None):
-        """Create waiting screen with QR code message"""
+    def _connectivity_loop(self):
+        """Refresh is_online every status_check_interval seconds (or when woken)"""
+        while not self._connectivity_stop.is_set():
+            self.is_online = self.check_internet_connection()
+            self._connectivity_wake.wait(self.status_check_interval)
+            self._connectivity_wake.clear()
+    
+    def render_title_sprite(self, text, org=(960, 150)):
+        """Rasterize an outlined title once; returns (sprite, mask, top-left)"""
+        strip = np.zeros((org[1] + 60, 1920, 3), dtype=np.uint8)
+        cv2.putText(strip, text, org, cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
+        cv2.putText(strip, text, org, cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 150, 255), 2)
+        
+        # Crop to the inked pixels
+        ink = strip.any(axis=2)
+        ys, xs = np.nonzero(ink)
+        y0, y1, x0, x1 = ys.min(), ys.max() + 1, xs.min(), xs.max() + 1
+        mask = ink[y0:y1, x0:x1].astype(np.uint8)
+        return strip[y0:y1, x0:x1].copy(), mask, (x0, y0)
+    
+    def paste_sprite(self, screen, sprite_info):
+        """Copy a pre-rendered sprite's inked pixels onto the screen"""
+        sprite, mask, (x0, y0) = sprite_info
+        h, w = mask.shape
+        x1, y1 = min(x0 + w, screen.shape[1]), min(y0 + h, screen.shape[0])
+        roi = screen[y0:y1, x0:x1]
+        cv2.copyTo(sprite[:y1 - y0, :x1 - x0], mask[:y1 - y0, :x1 - x0], dst=roi)
+    
+    def _build_waiting_background(self):
+        """Render the static part of the waiting screen"""
         # Create black background - use full screen resolution
         screen = np.zeros((1080, 1920, 3), dtype=np.uint8)
         
         # Add attraction name
-        cv2.putText(screen, f"SOU Gate: {self.attraction_name}", (960, 150), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
-        cv2.putText(screen, f"SOU Gate: {self.attraction_name}", (960, 150), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 150, 255), 2)
+        self.paste_sprite(screen, self._gate_title_sprite)
         
         # Add main message - properly centered
         message = "Waiting for QR code..."
@@ -59,20 +359,14 @@ class DisplayManager:
         # Add QR code icon (simplified)
         self.draw_qr_icon(screen, 960, 600)
         
-        # Add status information
-        self.add_status_info(screen, today_scans, db_stats=db_stats)
-        
         return screen
     
-    def create_success_screen(self, ticket_info, today_scans, processing_time=None, db_stats=None):
-        """Create success screen with green tick"""
+    def _build_success_background(self):
+        """Render the static part of the success screen"""
         screen = np.zeros((1080, 1920, 3), dtype=np.uint8)
         
         # Add attraction name
-        cv2.putText(screen, f"SOU {self.attraction_name}", (960, 150), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
-        cv2.putText(screen, f"SOU {self.attraction_name}", (960, 150), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 150, 255), 2)
+        self.paste_sprite(screen, self._title_sprite)
         
         # Draw green tick mark
         self.draw_tick_mark(screen, 960, 400, color=(0, 255, 0))
@@ -86,30 +380,14 @@ class DisplayManager:
         cv2.putText(screen, message, (x, 550), 
                    cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 255, 0), thickness)
         
-        # Add ticket info - properly centered
-        if ticket_info:
-            info_text = f"Entries: {ticket_info['persons_entered']}/{ticket_info['persons_allowed']}"
-            font_scale = 1.5
-            thickness = 2
-            (text_width, text_height), _ = cv2.getTextSize(info_text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
-            x = (1920 - text_width) // 2
-            cv2.putText(screen, info_text, (x, 620), 
-                       cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255, 255, 255), thickness)
-        
-        # Add status information
-        self.add_status_info(screen, today_scans, processing_time, db_stats)
-        
         return screen
     
-    def create_error_screen(self, reason, today_scans, processing_time=None, db_stats=None):
-        """Create error screen with red X"""
+    def _build_error_background(self):
+        """Render the static part of the error screen"""
         screen = np.zeros((1080, 1920, 3), dtype=np.uint8)
         
         # Add attraction name
-        cv2.putText(screen, f"SOU {self.attraction_name}", (960, 150), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
-        cv2.putText(screen, f"SOU {self.attraction_name}", (960, 150), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 150, 255), 2)
+        self.paste_sprite(screen, self._title_sprite)
         
         # Draw red X mark
         self.draw_x_mark(screen, 960, 400, color=(0, 0, 255))
@@ -123,42 +401,107 @@ class DisplayManager:
         cv2.putText(screen, message, (x, 550), 
                    cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 0, 255), thickness)
         
+        return screen
+    
+    def _compose(self, kind, body, today_scans, processing_time=None, db_stats=None, out=None):
+        """Draw a screen into out (default: the shared buffer) from its background, body and status"""
+        screen = self._scratch if out is None else out
+        
+        # Skip whatever the buffer already shows: nothing if the state is unchanged,
+        # everything but the status block if only the status changed
+        clock = self._wall_clock()
+        stats = (db_stats.get('total_tickets', 0), db_stats.get('unsynced_count', 0)) if db_stats is not None else None
+        state = (kind, body, clock[0], today_scans, processing_time, stats, self.is_online)
+        previous = self._screen_state.get(id(screen))
+        if previous == state:
+            return
+        
+        background = self._backgrounds[kind]
+        if previous is not None and previous[:2] == state[:2]:
+            # Restore just the dirty area
+            screen[STATUS_AREA] = background[STATUS_AREA]
+        else:
+            np.copyto(screen, background)
+            for text, org, font_scale in body:
+                cv2.putText(screen, text, org, 
+                           cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255, 255, 255), 2)
+        
+        # Add status information
+        self.add_status_info(screen, today_scans, processing_time, db_stats, clock=clock)
+        self._screen_state[id(screen)] = state
+    
+    def render_waiting(self, today_scans=0, db_stats=None, out=None):
+        """Render waiting screen with QR code message"""
+        self._compose('waiting', (), today_scans, db_stats=db_stats, out=out)
+    
+    def render_success(self, ticket_info, today_scans, processing_time=None, db_stats=None, out=None):
+        """Render success screen with green tick"""
+        body = ()
+        # Add ticket info - properly centered
+        if ticket_info:
+            info_text = f"Entries: {ticket_info['persons_entered']}/{ticket_info['persons_allowed']}"
+            font_scale = 1.5
+            thickness = 2
+            (text_width, text_height), _ = cv2.getTextSize(info_text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+            x = (1920 - text_width) // 2
+            body = ((info_text, (x, 620), font_scale),)
+        
+        self._compose('success', body, today_scans, processing_time, db_stats, out)
+    
+    def render_error(self, reason, today_scans, processing_time=None, db_stats=None, out=None):
+        """Render error screen with red X"""
         # Add reason - use smaller font and better positioning
+        body = tuple((line, org, 1.2) for line, org in self._reason_layout(reason))
+        
+        self._compose('error', body, today_scans, processing_time, db_stats, out)
+    
+    def _char_advances(self, font, font_scale, thickness):
+        """Pen advance of every byte value (unprintable ones measured as '?')"""
+        advances = np.zeros(256, dtype=np.int64)
+        for code in range(256):
+            ch = chr(code) if 32 <= code < 127 else '?'
+            (width, _), _ = cv2.getTextSize(ch, font, font_scale, thickness)
+            (pair_width, _), _ = cv2.getTextSize(ch * 2, font, font_scale, thickness)
+            advances[code] = pair_width - width
+        return advances
+    
+    def _reason_layout(self, reason):
+        """Line split and centered origins for an error reason (LRU-cached)"""
+        layout = self._reason_layouts.get(reason)
+        if layout is not None:
+            self._reason_layouts.move_to_end(reason)
+            return layout
+        
+        font_scale = 1.2
+        thickness = 2
+        text = ' '.join(reason.split())
+        
+        # Running pen position after each character, from the advance table
+        codes = np.frombuffer(text.encode('ascii', 'replace'), dtype=np.uint8)
+        widths = np.cumsum(self._reason_advances[codes])
+        
         # Split long text into multiple lines if needed
-        if len(reason) > 30:
-            # Split text into two lines
-            words = reason.split()
-            mid = len(words) // 2
-            line1 = ' '.join(words[:mid])
-            line2 = ' '.join(words[mid:])
-            
-            # Get text size for centering
-            font_scale = 1.2
-            thickness = 2
-            (text_width1, text_height1), _ = cv2.getTextSize(line1, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
-            (text_width2, text_height2), _ = cv2.getTextSize(line2, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
-            
-            # Center the text
-            x1 = (1920 - text_width1) // 2
-            x2 = (1920 - text_width2) // 2
-            
-            cv2.putText(screen, line1, (x1, 600), 
-                       cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255, 255, 255), thickness)
-            cv2.putText(screen, line2, (x2, 640), 
-                       cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255, 255, 255), thickness)
+        spaces = np.flatnonzero(codes == ord(' '))
+        if len(spaces) and widths[-1] > REASON_WRAP_WIDTH:
+            # Break at the space that balances the two line widths best
+            middle = np.searchsorted(widths[spaces], widths[-1] / 2)
+            candidates = spaces[max(middle - 1, 0):middle + 1]
+            split = candidates[np.argmin(np.abs(widths[candidates] - widths[-1] / 2))]
+            lines = [(text[:split], 600), (text[split + 1:], 640)]
         else:
             # Single line text
-            font_scale = 1.2
-            thickness = 2
-            (text_width, text_height), _ = cv2.getTextSize(reason, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
-            x = (1920 - text_width) // 2
-            cv2.putText(screen, reason, (x, 620), 
-                       cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255, 255, 255), thickness)
+            lines = [(text, 620)]
         
-        # Add status information
-        self.add_status_info(screen, today_scans, processing_time, db_stats)
+        # Center each line
+        layout = []
+        for line, y in lines:
+            (text_width, _), _ = cv2.getTextSize(line, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+            layout.append((line, ((1920 - text_width) // 2, y)))
         
-        return screen
+        self._reason_layouts[reason] = layout
+        if len(self._reason_layouts) > REASON_LAYOUT_CACHE_SIZE:
+            self._reason_layouts.popitem(last=False)
+        return layout
     
     def draw_qr_icon(self, screen, x, y, size=80):
         """Draw a simple QR code icon"""
@@ -188,44 +531,52 @@ class DisplayManager:
         cv2.line(screen, (x-size//2, y-size//2), (x+size//2, y+size//2), color, thickness)
         cv2.line(screen, (x+size//2, y-size//2), (x-size//2, y+size//2), color, thickness)
     
-    def add_status_info(self, screen, today_scans, processing_time=None, db_stats=None):
+    def _blit_text(self, screen, text, org, color):
+        """Draw status text (SIMPLEX, scale 1, thickness 2) from the glyph atlas"""
+        atlas = self._atlases.get(color)
+        if atlas is None:
+            atlas = self._atlases[color] = GlyphAtlas(cv2.FONT_HERSHEY_SIMPLEX, 1, 2, color)
+        atlas.draw(screen, text, org)
+    
+    def _wall_clock(self):
+        """(second, date_str, time_str) for the current wall-clock second, formatted once per second"""
+        second = int(time.time())
+        clock = self._clock
+        if clock[0] != second:
+            now = datetime.fromtimestamp(second)
+            # One tuple, so the composition thread never sees a half-updated clock
+            clock = self._clock = (second, now.strftime("%Y-%m-%d"), now.strftime("%H:%M:%S"))
+        return clock
+    
+    def add_status_info(self, screen, today_scans, processing_time=None, db_stats=None, clock=None):
         """Add status information to screen"""
         # Current date and time
-        now = datetime.now()
-        date_str = now.strftime("%Y-%m-%d")
-        time_str = now.strftime("%H:%M:%S")
+        _, date_str, time_str = clock if clock is not None else self._wall_clock()
         
         # Left side information
-        cv2.putText(screen, f"Date: {date_str}", (50, 900), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-        cv2.putText(screen, f"Time: {time_str}", (50, 930), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        self._blit_text(screen, f"Date: {date_str}", (50, 900), (255, 255, 255))
+        self._blit_text(screen, f"Time: {time_str}", (50, 930), (255, 255, 255))
         
         # Today's scan count
-        cv2.putText(screen, f"Today's Scans: {today_scans}", (50, 960), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        self._blit_text(screen, f"Today's Scans: {today_scans}", (50, 960), (255, 255, 255))
         
         # Processing time (if provided)
         if processing_time is not None:
             processing_ms = processing_time * 1000  # Convert to milliseconds
-            cv2.putText(screen, f"Processing: {processing_ms:.1f}ms", (50, 990), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
+            self._blit_text(screen, f"Processing: {processing_ms:.1f}ms", (50, 990), (0, 255, 255))
         
         # Database statistics (if provided)
         if db_stats is not None:
-            cv2.putText(screen, f"Total Records: {db_stats.get('total_tickets', 0)}", (50, 1020), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+            self._blit_text(screen, f"Total Records: {db_stats.get('total_tickets', 0)}", (50, 1020), (255, 255, 255))
             unsynced = db_stats.get('unsynced_count', 0)
             unsynced_color = (255, 165, 0) if unsynced > 0 else (0, 255, 0)  # Orange if unsynced, green if all synced
-            cv2.putText(screen, f"Unsynced: {unsynced}", (50, 1050), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 1, unsynced_color, 2)
+            self._blit_text(screen, f"Unsynced: {unsynced}", (50, 1050), unsynced_color)
         
         # Right side - Online/Offline status
         status_color = (0, 255, 0) if self.is_online else (0, 0, 255)
         status_text = "ONLINE" if self.is_online else "OFFLINE"
         
-        cv2.putText(screen, f"Status: {status_text}", (1500, 900), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 1, status_color, 2)
+        self._blit_text(screen, f"Status: {status_text}", (1500, 900), status_color)
         
         # Connection indicator dot
         dot_color = (0, 255, 0) if self.is_online else (0, 0, 255)
@@ -233,43 +584,74 @@ class DisplayManager:
         
         # Bottom right - Quit instruction
         quit_text = "Press 'q' to quit"
-        cv2.putText(screen, quit_text, (1600, 1050), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        self._blit_text(screen, quit_text, (1600, 1050), (255, 255, 255))
     
     def update_connection_status(self):
-        """Update internet connection status"""
-        self.is_online = self.check_internet_connection()
+        """Ask the connectivity thread for an early re-check (non-blocking)"""
+        self._connectivity_wake.set()
     
     def maybe_update_connection_status(self):
-        """Update connection status at most once per configured interval"""
-        now = time.time()
-        if now - self.last_status_check_time >= self.status_check_interval:
-            self.is_online = self.check_internet_connection()
-            self.last_status_check_time = now
+        """Connection status is refreshed by the connectivity thread - nothing to do"""
+        return self.is_online
     
     def can_scan(self):
         """Check if enough time has passed since last scan"""
-        current_time = time.time()
+        # Monotonic, so wall-clock adjustments (NTP sync) can't block or skip the cooldown
+        current_time = time.monotonic()
         return current_time - self.last_scan_time > self.scan_cooldown
     
     def mark_scan_time(self):
         """Mark the current time as last scan time"""
-        self.last_scan_time = time.time()
+        self.last_scan_time = time.monotonic()
     
-    def show_screen(self, screen):
-        """Display the screen"""
-        cv2.imshow(self.window_name, screen)
+    def reset_scan_cooldown(self):
+        """Allow the next scan immediately"""
+        self.last_scan_time = float('-inf')
+    
+    def show_screen(self, screen=None):
+        """Display the screen (default: the shared buffer the render_* methods draw into)"""
+        if screen is None:
+            screen = self._scratch
+        if self.framebuffer is not None:
+            self.framebuffer.show(screen)
+        else:
+            cv2.imshow(self.window_name, screen)
+    
+    def request_waiting_screen(self, today_scans=0, db_stats=None):
+        """Ask the display worker to compose a fresh waiting screen"""
+        self.worker.submit(self.render_waiting, today_scans, db_stats=db_stats)
+    
+    def show_latest_screen(self):
+        """Display the newest screen composed by the worker, if any"""
+        screen = self.worker.take_screen()
+        if screen is not None:
+            self.show_screen(screen)
     
     def setup_fullscreen(self):
         """Setup fullscreen window"""
-        cv2.namedWindow(self.window_name, cv2.WINDOW_NORMAL)
-        cv2.setWindowProperty(self.window_name, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
-        # Set window size to full screen
-        cv2.resizeWindow(self.window_name, 1920, 1080)
+        # Without X (kiosk console) draw straight into the framebuffer
+        if not (os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY')):
+            self.framebuffer = FramebufferDisplay.open(1920, 1080)
+        if self.framebuffer is not None:
+            print("[INFO] Drawing directly to the framebuffer")
+        else:
+            cv2.namedWindow(self.window_name, cv2.WINDOW_NORMAL)
+            cv2.setWindowProperty(self.window_name, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+            # Set window size to full screen
+            cv2.resizeWindow(self.window_name, 1920, 1080)
+        self.worker.start()
     
     def cleanup(self):
         """Cleanup display resources"""
-        cv2.destroyAllWindows()
+        self.worker.stop()
+        self._connectivity_stop.set()
+        self._connectivity_wake.set()
+        self._session.close()
+        if self.framebuffer is not None:
+            self.framebuffer.close()
+            self.framebuffer = None
+        else:
+            cv2.destroyAllWindows()
 
 def test_display_manager():
     """Test display manager functionality"""
@@ -279,19 +661,19 @@ def test_display_manager():
     dm.setup_fullscreen()
     
     # Test waiting screen
-    waiting_screen = dm.create_waiting_screen(5)
-    dm.show_screen(waiting_screen)
+    dm.render_waiting(5)
+    dm.show_screen()
     cv2.waitKey(2000)
     
     # Test success screen
     ticket_info = {'persons_allowed': 2, 'persons_entered': 1}
-    success_screen = dm.create_success_screen(ticket_info, 6)
-    dm.show_screen(success_screen)
+    dm.render_success(ticket_info, 6)
+    dm.show_screen()
     cv2.waitKey(2000)
     
     # Test error screen
-    error_screen = dm.create_error_screen("QR already scanned", 6)
-    dm.show_screen(error_screen)
+    dm.render_error("QR already scanned", 6)
+    dm.show_screen()
     cv2.waitKey(2000)
     
     dm.cleanup()
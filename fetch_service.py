@@ -4,26 +4,74 @@ Fetch Service for SOU Raspberry Pi
 Background service to fetch tickets from server and create local records
 """
 
+import os
+import sys
+import hashlib
 import requests
-import json
 import time
+import signal
 import logging
-from datetime import datetime
+import threading
+from logging.handlers import RotatingFileHandler
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from config import config
 from ticket_database import TicketDatabase
 
+try:
+    import orjson  # Faster decode of in-memory payloads when available
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+SEEN_TTL_SECONDS = 300  # How long an unchanged server ticket is trusted without re-writing it
+SEEN_MAX_ENTRIES = 10000  # LRU bound on that cache (a few MB at most)
+
+# Server ticket field names, in either casing the API has used
+PASCAL_CASE_KEYS = ("ReferenceNo", "BookingDate", "Attractions")
+CAMEL_CASE_KEYS = ("referenceNo", "bookingDate", "attractions")
+STREAM_PARSE_MIN_BYTES = 4 * 1024 * 1024  # Stream-parse (ijson) responses larger than this
+
 class FetchService:
     """Background service to fetch tickets from server"""
     
     def __init__(self):
         """Initialize fetch service"""
         self.setup_logging()
-        self.attractions = ["AttractionA", "AttractionB", "AttractionC"]
-        self.databases = {}
+        self.attractions = ("AttractionA", "AttractionB", "AttractionC")
+        
+        # Initialize databases for all attractions, paired with their names for the write loop
+        self._dbs = tuple((attraction, TicketDatabase(attraction)) for attraction in self.attractions)
+        self.databases = dict(self._dbs)
+        
+        # (date, "YYYY-MM-DD") - re-formatted only when the day rolls over
+        self._today_cache = (None, None)
         
-        # Initialize databases for all attractions
-        for attraction in self.attractions:
-            self.databases[attraction] = TicketDatabase(attraction)
+        # ticket_no -> (row, monotonic expiry) of tickets already written to every
+        # database, least recently seen first
+        self._seen = OrderedDict()
+        
+        # (date, body digest, ETag) of the last payload that was fully stored, and of
+        # the one being processed
+        self._last_payload = None
+        self._pending_payload = None
+        
+        # Set on SIGTERM - interrupts the waits between cycles and retries
+        self._stop_event = threading.Event()
+        
+        # Each attraction database is its own file, so their writes can overlap
+        # (sqlite3 releases the GIL while it works; connections are per thread)
+        self._pool = ThreadPoolExecutor(max_workers=len(self.attractions), thread_name_prefix="FetchWriter")
+        
+        # One HTTP session for the life of the service (keep-alive across cycles)
+        self.session = self.create_session()
         
         # Log configuration for debugging
         self.log_configuration()
@@ -31,16 +79,52 @@ class FetchService:
         self.logger.info("Fetch Service initialized")
     
     def setup_logging(self):
-        """Setup logging for the service"""
-        logging.basicConfig(
-            level=getattr(logging, config.get('logging.level', 'INFO')),
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(config.get('logging.file', 'sou_system.log')),
-                logging.StreamHandler()
-            ]
-        )
+        """Setup logging for the service (safe to call more than once)"""
         self.logger = logging.getLogger('FetchService')
+        if self.logger.handlers:
+            return
+        
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        
+        # The other services append to logging.file through plain FileHandlers, so rotating
+        # that shared file would split their output - the fetch log gets a file of its own
+        # (sou_system.log -> sou_system_fetch.log)
+        root, ext = os.path.splitext(config.get('logging.file', 'sou_system.log'))
+        handlers = [
+            # Size-capped log file so the SD card can't fill up
+            RotatingFileHandler(f"{root}_fetch{ext or '.log'}",
+                                maxBytes=config.get('logging.max_size', 10485760),
+                                backupCount=config.get('logging.backup_count', 5)),
+            logging.StreamHandler()
+        ]
+        for handler in handlers:
+            handler.setFormatter(formatter)
+            self.logger.addHandler(handler)
+        self.logger.setLevel(getattr(logging, config.get('logging.level', 'INFO')))
+        # Own handlers only - don't also write through any root handlers
+        self.logger.propagate = False
+    
+    def create_session(self):
+        """Create the HTTP session with connection pooling, keep-alive and retries"""
+        session = requests.Session()
+        session.headers.update({
+            'User-Agent': 'SOU-RasPi-FetchService/1.0',
+            'Connection': 'keep-alive',
+            'Accept': 'application/json'
+        })
+        
+        # Server-side errors are retried by urllib3; connection errors by fetch_tickets_from_server
+        retry_strategy = Retry(
+            total=2,
+            backoff_factor=1,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["HEAD", "GET", "OPTIONS"]
+        )
+        
+        adapter = HTTPAdapter(max_retries=retry_strategy, pool_connections=1, pool_maxsize=1)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
     
     def log_configuration(self):
         """Log current configuration for debugging"""
@@ -63,35 +147,38 @@ class FetchService:
         
         self.logger.info(f"Fetching tickets from: {url}")
         
+        # The same payload means the same work only on the same day (the date filter moves)
+        today = self.today_str()
+        last = self._last_payload if self._last_payload and self._last_payload[0] == today else None
+        headers = {'If-None-Match': last[2]} if last and last[2] else {}
+        
         for attempt in range(retry_attempts):
             try:
-                # Create session with connection pooling and keep-alive
-                session = requests.Session()
-                session.headers.update({
-                    'User-Agent': 'SOU-RasPi-FetchService/1.0',
-                    'Connection': 'keep-alive',
-                    'Accept': 'application/json'
-                })
-                
-                # Configure connection adapter with retry strategy
-                from requests.adapters import HTTPAdapter
-                from urllib3.util.retry import Retry
-                
-                retry_strategy = Retry(
-                    total=2,
-                    backoff_factor=1,
-                    status_forcelist=[429, 500, 502, 503, 504],
-                    allowed_methods=["HEAD", "GET", "OPTIONS"]
-                )
-                
-                adapter = HTTPAdapter(max_retries=retry_strategy, pool_connections=1, pool_maxsize=1)
-                session.mount("http://", adapter)
-                session.mount("https://", adapter)
-                
-                response = session.get(url, timeout=timeout)
+                response = self.session.get(url, timeout=timeout, stream=True, headers=headers)
                 response.raise_for_status()
                 
-                tickets_data = response.json()
+                if response.status_code == 304:
+                    response.close()
+                    return []
+                etag = response.headers.get('ETag')
+                
+                # Large (or unsized) payloads are decoded one ticket at a time
+                content_length = response.headers.get('Content-Length')
+                if ijson is not None and (content_length is None or int(content_length) > STREAM_PARSE_MIN_BYTES):
+                    self.logger.info("Streaming tickets from server")
+                    self._pending_payload = (today, None, etag)
+                    return self.stream_tickets(response)
+                
+                # Identical body to the last fully processed one - skip parsing and writing
+                digest = hashlib.blake2b(response.content, digest_size=16).digest()
+                if last and last[1] == digest:
+                    return []
+                self._pending_payload = (today, digest, etag)
+                
+                if orjson is not None:
+                    tickets_data = orjson.loads(response.content)
+                else:
+                    tickets_data = response.json()
                 self.logger.info(f"Fetched {len(tickets_data)} tickets from server")
                 
                 return tickets_data
@@ -100,7 +187,7 @@ class FetchService:
                 self.logger.warning(f"Connection error (attempt {attempt + 1}/{retry_attempts}): {e}")
                 if attempt < retry_attempts - 1:
                     self.logger.info(f"Retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
+                    self._stop_event.wait(retry_delay)
                 else:
                     self.logger.error(f"Failed to connect after {retry_attempts} attempts")
                     
@@ -108,7 +195,7 @@ class FetchService:
                 self.logger.warning(f"Timeout error (attempt {attempt + 1}/{retry_attempts}): {e}")
                 if attempt < retry_attempts - 1:
                     self.logger.info(f"Retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
+                    self._stop_event.wait(retry_delay)
                 else:
                     self.logger.error(f"Request timed out after {retry_attempts} attempts")
                     
@@ -116,11 +203,11 @@ class FetchService:
                 self.logger.error(f"Request error (attempt {attempt + 1}/{retry_attempts}): {e}")
                 if attempt < retry_attempts - 1:
                     self.logger.info(f"Retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
+                    self._stop_event.wait(retry_delay)
                 else:
                     self.logger.error(f"Request failed after {retry_attempts} attempts")
                     
-            except json.JSONDecodeError as e:
+            except ValueError as e:  # json.JSONDecodeError and orjson.JSONDecodeError
                 self.logger.error(f"Error parsing JSON response: {e}")
                 return None
                 
@@ -130,97 +217,186 @@ class FetchService:
         
         return None
     
+    def today_str(self):
+        """Today's date as YYYY-MM-DD (interned, so equal booking dates compare by identity first)"""
+        today = date.today()
+        if today != self._today_cache[0]:
+            self._today_cache = (today, sys.intern(today.isoformat()))
+        return self._today_cache[1]
+    
+    def stream_tickets(self, response):
+        """Yield tickets from a top-level JSON array without loading the whole body"""
+        try:
+            response.raw.decode_content = True  # Undo gzip/deflate transfer encoding
+            yield from ijson.items(response.raw, 'item')
+        finally:
+            response.close()
+    
+    def ticket_row(self, ticket_no, booking_date, attractions_data):
+        """Flatten a server ticket into a TicketDatabase.bulk_upsert row"""
+        a = attractions_data.get('A', {})
+        b = attractions_data.get('B', {})
+        c = attractions_data.get('C', {})
+        return (ticket_no, booking_date, ticket_no,
+                a.get('pax', 0), a.get('used', 0),
+                b.get('pax', 0), b.get('used', 0),
+                c.get('pax', 0), c.get('used', 0))
+    
     def process_tickets(self, tickets_data):
         """Process fetched tickets and create/update local records"""
         if not tickets_data:
-            return
+            return True
         
         processed_count = 0
         created_count = 0
         updated_count = 0
         skipped_count = 0
-        today = datetime.now().strftime("%Y-%m-%d")
+        unchanged_count = 0
+        today = self.today_str()
+        now = time.monotonic()
+        seen = self._seen
+        rows = []
+        
+        # Bind what the per-ticket loop uses once
+        seen_get = seen.get
+        add_row = rows.append
+        ticket_row = self.ticket_row
+        log_debug = self.logger.debug
+        debug_enabled = self.logger.isEnabledFor(logging.DEBUG)
+        dbs = self._dbs
+        keys = None
         
         for ticket_data in tickets_data:
             try:
-                # Extract ticket information (handle both camelCase and PascalCase)
-                ticket_no = ticket_data.get("ReferenceNo") or ticket_data.get("referenceNo")
-                booking_date = ticket_data.get("BookingDate") or ticket_data.get("bookingDate")
-                attractions_data = ticket_data.get("Attractions", {}) or ticket_data.get("attractions", {})
+                # Extract ticket information - one lookup per field using the key casing
+                # (PascalCase or camelCase) of the batch's first ticket
+                if keys is None:
+                    keys = PASCAL_CASE_KEYS if PASCAL_CASE_KEYS[0] in ticket_data else CAMEL_CASE_KEYS
+                ticket_no = ticket_data.get(keys[0])
+                booking_date = ticket_data.get(keys[1])
+                attractions_data = ticket_data.get(keys[2])
                 
                 if not ticket_no or not booking_date or not attractions_data:
-                    self.logger.warning(f"⚠️  Skipping invalid ticket data: {ticket_data}")
+                    # Casing differs from the rest of the batch - normalize this ticket's keys
+                    lowered = {key.lower(): value for key, value in ticket_data.items()}
+                    ticket_no = lowered.get("referenceno")
+                    booking_date = lowered.get("bookingdate")
+                    attractions_data = lowered.get("attractions")
+                
+                if not ticket_no or not booking_date or not attractions_data:
+                    self.logger.warning("⚠️  Skipping invalid ticket data: %s", ticket_data)
                     continue
                 
                 # Only process tickets for today's date
                 if booking_date != today:
-                    self.logger.debug(f"Skipping ticket {ticket_no} - not for today (booking_date: {booking_date}, today: {today})")
+                    if debug_enabled:
+                        log_debug("Skipping ticket %s - not for today (booking_date: %s, today: %s)",
+                                  ticket_no, booking_date, today)
                     skipped_count += 1
                     continue
                 
-                # Process for each attraction database
-                for attraction in self.attractions:
-                    db = self.databases[attraction]
-                    
-                    # Check if ticket already exists
-                    if db.ticket_exists(ticket_no):
-                        # Update existing ticket (smart update: only increases used counts)
-                        success = db.add_ticket(ticket_no, booking_date, ticket_no, attractions_data)
-                        if success:
-                            updated_count += 1
-                            self.logger.debug(f"Updated ticket {ticket_no} in {attraction} (smart update: used counts only increase)")
-                        else:
-                            self.logger.error(f"Failed to update ticket {ticket_no} in {attraction}")
-                    else:
-                        # Create new ticket
-                        success = db.add_ticket(ticket_no, booking_date, ticket_no, attractions_data)
-                        if success:
-                            created_count += 1
-                            self.logger.debug(f"Created new ticket {ticket_no} in {attraction}")
-                        else:
-                            self.logger.error(f"Failed to create ticket {ticket_no} in {attraction}")
-                
+                row = ticket_row(ticket_no, booking_date, attractions_data)
                 processed_count += 1
                 
+                # Same server state as a recent cycle - the databases already have it
+                cached = seen_get(ticket_no)
+                if cached is not None and cached[0] == row and cached[1] > now:
+                    seen.move_to_end(ticket_no)
+                    unchanged_count += 1
+                    continue
+                
+                add_row(row)
+                
             except Exception as e:
-                self.logger.error(f"Error processing ticket {ticket_data}: {e}")
+                self.logger.error("Error processing ticket %s: %s", ticket_data, e)
+        
+        # One upsert transaction per attraction database (smart update: used counts only increase)
+        all_written = True
+        if rows:
+            def write(db):
+                # Today's existing tickets in one query, to tell creates from updates in memory
+                existing = db.get_ticket_numbers(today)
+                new_count = sum(1 for row in rows if row[0] not in existing)
+                return db.bulk_upsert(rows), new_count
+            
+            results = self._pool.map(write, [db for _, db in dbs])
+            for (attraction, _), (success, new_count) in zip(dbs, results):
+                if success:
+                    created_count += new_count
+                    updated_count += len(rows) - new_count
+                    log_debug("Upserted %d tickets in %s (%d new)", len(rows), attraction, new_count)
+                else:
+                    all_written = False
+                    self.logger.error(f"Failed to upsert {len(rows)} tickets in {attraction}")
+            
+            # Only trust rows that reached every database
+            if all_written:
+                expiry = now + SEEN_TTL_SECONDS
+                for row in rows:
+                    seen[row[0]] = (row, expiry)
+                    seen.move_to_end(row[0])
+                while len(seen) > SEEN_MAX_ENTRIES:
+                    seen.popitem(last=False)
+        
+        # Drop expired entries once per cycle
+        for ticket_no in [t for t, (_, expiry) in seen.items() if expiry <= now]:
+            del seen[ticket_no]
         
-        self.logger.info(f"Processed {processed_count} tickets: {created_count} created, {updated_count} updated, {skipped_count} skipped (not today's date)")
+        self.logger.info(f"Processed {processed_count} tickets: {created_count} created, {updated_count} updated, {unchanged_count} unchanged, {skipped_count} skipped (not today's date)")
+        return all_written
     
     def run_fetch_cycle(self):
         """Run a single fetch cycle"""
         self.logger.info("Starting fetch cycle")
         
         # Fetch tickets from server
+        self._pending_payload = None
         tickets_data = self.fetch_tickets_from_server()
         
         if tickets_data:
-            # Process and store tickets
-            self.process_tickets(tickets_data)
+            # Process and store tickets (a stream can still fail while it is read)
+            try:
+                if self.process_tickets(tickets_data):
+                    # Fully stored - an identical payload next time can be skipped
+                    self._last_payload = self._pending_payload
+            except Exception as e:
+                self.logger.error(f"Error processing fetched tickets: {e}")
+        elif tickets_data is not None:
+            self.logger.info("No new ticket data since last fetch, skipping processing")
         else:
             self.logger.warning("No tickets fetched, skipping processing")
         
         self.logger.info("Fetch cycle completed")
     
+    def _handle_sigterm(self, signum, frame):
+        """Stop the service loop on SIGTERM"""
+        self.logger.info("Termination signal received, stopping...")
+        self._stop_event.set()
+    
     def run(self):
         """Main service loop"""
         self.logger.info("Fetch Service started")
         
+        # Signal handlers can only be installed from the main thread
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self._handle_sigterm)
+        
         fetch_interval = config.get('services.fetch_interval', 300)  # 5 minutes default
+        fetch_enabled = config.get('services.fetch_enabled', True)  # Config is loaded once per process
         consecutive_failures = 0
         max_consecutive_failures = 5
         
-        while True:
+        while not self._stop_event.is_set():
             try:
-                if config.get('services.fetch_enabled', True):
+                if fetch_enabled:
                     self.run_fetch_cycle()
                     consecutive_failures = 0  # Reset failure counter on success
                 else:
                     self.logger.info("Fetch service is disabled in configuration")
                 
-                # Wait for next cycle
+                # Wait for next cycle (returns early on SIGTERM)
                 self.logger.info(f"Waiting {fetch_interval} seconds for next fetch cycle")
-                time.sleep(fetch_interval)
+                self._stop_event.wait(fetch_interval)
                 
             except KeyboardInterrupt:
                 self.logger.info("Fetch Service stopped by user")
@@ -232,7 +408,11 @@ class FetchService:
                 # For demo: use constant wait time instead of exponential backoff
                 wait_time = 10  # Constant 10 seconds for demo
                 self.logger.info(f"Waiting {wait_time} seconds before retry (constant wait for demo)")
-                time.sleep(wait_time)
+                self._stop_event.wait(wait_time)
+        
+        self._pool.shutdown(wait=True)
+        self.session.close()
+        self.logger.info("Fetch Service stopped")
 
 def main():
     """Main entry point for fetch service"""
@@ -9,6 +9,48 @@ import os
 import shutil
 from datetime import datetime
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+FICLONE = 0x40049409  # linux/fs.h _IOW(0x94, 9, int): share the source's extents copy-on-write
+
+# Old rows are reshaped entirely inside SQLite; {columns} is the old table's select list
+# (see old_columns), renamed here to the names the old structure is documented with
+MIGRATE_TICKETS_SQL = '''
+    WITH old_tickets (ticket_no, persons_allowed, persons_entered, is_synced, attractions, created_at, last_scan) AS (
+        SELECT {columns} FROM old.tickets
+    ),
+    parsed AS (
+        -- Attractions string (e.g. "A,B" or "A, B, C") normalized to ",A,B,C," for exact matches
+        SELECT *, ',' || replace(attractions, ' ', '') || ',' AS attraction_list
+        FROM old_tickets
+        WHERE ticket_no IS NOT NULL AND attractions IS NOT NULL
+    )
+    INSERT INTO main.tickets 
+    (ticket_no, booking_date, reference_no, A_pax, A_used, B_pax, B_used, C_pax, C_used, is_synced, created_at, last_scan)
+    SELECT ticket_no, '2025-01-01', ticket_no,
+           CASE WHEN instr(attraction_list, ',A,') THEN persons_allowed ELSE 0 END,
+           CASE WHEN instr(attraction_list, ',A,') THEN persons_entered ELSE 0 END,
+           CASE WHEN instr(attraction_list, ',B,') THEN persons_allowed ELSE 0 END,
+           CASE WHEN instr(attraction_list, ',B,') THEN persons_entered ELSE 0 END,
+           CASE WHEN instr(attraction_list, ',C,') THEN persons_allowed ELSE 0 END,
+           CASE WHEN instr(attraction_list, ',C,') THEN persons_entered ELSE 0 END,
+           is_synced, created_at, last_scan
+    FROM parsed
+'''
+
+MIGRATE_HISTORY_SQL = '''
+    WITH old_history (id, ticket_no, scan_time, result, reason) AS (
+        SELECT {columns} FROM old.scan_history
+    )
+    INSERT INTO main.scan_history (ticket_no, scan_time, result, reason)
+    SELECT ticket_no, scan_time, result, reason
+    FROM old_history
+    WHERE ticket_no IS NOT NULL AND result IS NOT NULL
+'''
+
 class DatabaseMigrator:
     """Handles migration from old to new database structure"""
     
@@ -17,6 +59,22 @@ class DatabaseMigrator:
         self.attractions = ["AttractionA", "AttractionB", "AttractionC"]
         self.backup_suffix = f"_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
     
+    def clone_file(self, src, dst):
+        """Reflink src to dst (btrfs, XFS); return False if the filesystem can't"""
+        if fcntl is None:
+            return False
+        
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            if os.path.exists(dst):
+                os.remove(dst)
+            return False
+        
+        shutil.copystat(src, dst)
+        return True
+    
     def backup_database(self, db_path):
         """Create backup of existing database"""
         if not os.path.exists(db_path):
@@ -24,8 +82,20 @@ class DatabaseMigrator:
             return None
         
         backup_path = db_path + self.backup_suffix
-        shutil.copy2(db_path, backup_path)
-        print(f"✅ Created backup: {backup_path}")
+        
+        # Snapshot without copying data where possible: a reflink, else a hard link -
+        # the migration never writes db_path in place, it renames the new database over it
+        if self.clone_file(db_path, backup_path):
+            method = "reflink"
+        else:
+            try:
+                os.link(db_path, backup_path)
+                method = "hard link"
+            except OSError:
+                shutil.copy2(db_path, backup_path)
+                method = "copy"
+        
+        print(f"✅ Created backup ({method}): {backup_path}")
         return backup_path
     
     def check_old_structure(self, db_path):
@@ -69,6 +139,19 @@ class DatabaseMigrator:
             conn.close()
             return False
     
+    def old_columns(self, conn, table, count):
+        """Select list for the first `count` columns of the attached old table, padded with NULLs"""
+        names = [f'"{row[1]}"' for row in conn.execute(f"PRAGMA old.table_info({table})")]
+        return ", ".join((names + ["NULL"] * count)[:count])
+    
+    def copy_table(self, conn, sql, table, count):
+        """Run one INSERT...SELECT from the old table; return (copied, skipped) row counts"""
+        before = conn.total_changes  # rowcount is not reported for WITH ... INSERT statements
+        conn.execute(sql.format(columns=self.old_columns(conn, table, count)))
+        copied = conn.total_changes - before
+        total = conn.execute(f"SELECT COUNT(*) FROM old.{table}").fetchone()[0]
+        return copied, total - copied
+    
     def migrate_attraction_database(self, attraction_name):
         """Migrate a single attraction database"""
         db_path = f"{attraction_name}.db"
@@ -90,6 +173,15 @@ class DatabaseMigrator:
             conn_new = sqlite3.connect(new_db_path)
             cursor_new = conn_new.cursor()
             
+            # Same settings the scanners run with (WAL, one sync per checkpoint), plus a big import cache
+            cursor_new.executescript('''
+                PRAGMA journal_mode=WAL;
+                PRAGMA synchronous=NORMAL;
+                PRAGMA temp_store=MEMORY;
+                PRAGMA cache_size=-20000;
+                PRAGMA mmap_size=268435456;
+            ''')
+            
             # Create new table structure
             cursor_new.execute('''
                 CREATE TABLE tickets (
@@ -119,76 +211,35 @@ class DatabaseMigrator:
                 )
             ''')
             
-            # Create indexes
+            # Attach the old database so rows never leave SQLite
+            conn_new.execute("ATTACH DATABASE ? AS old", (db_path,))
+            
+            # Copy everything in one transaction.
+            # No syncing while importing: this file only replaces the original once complete,
+            # and a backup exists either way
+            conn_new.execute("PRAGMA synchronous=OFF")
+            conn_new.execute("BEGIN")
+            migrated_count, skipped_tickets = self.copy_table(conn_new, MIGRATE_TICKETS_SQL, "tickets", 7)
+            _, skipped_history = self.copy_table(conn_new, MIGRATE_HISTORY_SQL, "scan_history", 5)
+            conn_new.commit()
+            conn_new.execute("DETACH DATABASE old")
+            
+            if skipped_tickets:
+                print(f"⚠️  Skipped {skipped_tickets} tickets without a ticket number or attractions")
+            if skipped_history:
+                print(f"⚠️  Skipped {skipped_history} history items without a ticket number or result")
+            
+            # Create indexes once the data is in - one sorted build each instead of per-row updates
             cursor_new.execute('CREATE INDEX idx_ticket_no ON tickets(ticket_no)')
             cursor_new.execute('CREATE INDEX idx_scan_time ON scan_history(scan_time)')
             cursor_new.execute('CREATE INDEX idx_is_synced ON tickets(is_synced)')
             cursor_new.execute('CREATE INDEX idx_last_scan ON tickets(last_scan)')
             cursor_new.execute('CREATE INDEX idx_scan_history_ticket ON scan_history(ticket_no)')
-            
-            # Read old data
-            conn_old = sqlite3.connect(db_path)
-            cursor_old = conn_old.cursor()
-            
-            cursor_old.execute('SELECT * FROM tickets')
-            old_tickets = cursor_old.fetchall()
-            
-            cursor_old.execute('SELECT * FROM scan_history')
-            old_history = cursor_old.fetchall()
-            
-            # Migrate tickets data
-            migrated_count = 0
-            for old_ticket in old_tickets:
-                try:
-                    # Extract old data (assuming old structure)
-                    ticket_no = old_ticket[0]
-                    persons_allowed = old_ticket[1]
-                    persons_entered = old_ticket[2]
-                    is_synced = old_ticket[3]
-                    attractions = old_ticket[4]
-                    created_at = old_ticket[5] if len(old_ticket) > 5 else None
-                    last_scan = old_ticket[6] if len(old_ticket) > 6 else None
-                    
-                    # Parse attractions string (e.g., "A,B" or "A,B,C")
-                    attraction_list = [a.strip() for a in attractions.split(',')]
-                    
-                    # Set default booking date and reference number
-                    booking_date = "2025-01-01"  # Default date
-                    reference_no = ticket_no
-                    
-                    # Initialize attraction data
-                    a_pax = persons_allowed if 'A' in attraction_list else 0
-                    a_used = persons_entered if 'A' in attraction_list else 0
-                    b_pax = persons_allowed if 'B' in attraction_list else 0
-                    b_used = persons_entered if 'B' in attraction_list else 0
-                    c_pax = persons_allowed if 'C' in attraction_list else 0
-                    c_used = persons_entered if 'C' in attraction_list else 0
-                    
-                    # Insert into new structure
-                    cursor_new.execute('''
-                        INSERT INTO tickets 
-                        (ticket_no, booking_date, reference_no, A_pax, A_used, B_pax, B_used, C_pax, C_used, is_synced, created_at, last_scan)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (ticket_no, booking_date, reference_no, a_pax, a_used, b_pax, b_used, c_pax, c_used, is_synced, created_at, last_scan))
-                    
-                    migrated_count += 1
-                    
-                except Exception as e:
-                    print(f"⚠️  Error migrating ticket {old_ticket[0]}: {e}")
-            
-            # Migrate scan history
-            for old_history_item in old_history:
-                try:
-                    cursor_new.execute('''
-                        INSERT INTO scan_history (ticket_no, scan_time, result, reason)
-                        VALUES (?, ?, ?, ?)
-                    ''', (old_history_item[1], old_history_item[2], old_history_item[3], old_history_item[4]))
-                except Exception as e:
-                    print(f"⚠️  Error migrating history item: {e}")
-            
             conn_new.commit()
+            
+            # Back to NORMAL so the checkpoint on close syncs the file before it is renamed into place
+            conn_new.execute("PRAGMA synchronous=NORMAL")
             conn_new.close()
-            conn_old.close()
             
             # Replace old database with new one
             os.remove(db_path)
@@ -201,8 +252,15 @@ class DatabaseMigrator:
             print(f"❌ Error migrating {attraction_name}: {e}")
             # Restore backup if migration failed
             if backup_path and os.path.exists(backup_path):
-                shutil.copy2(backup_path, db_path)
-                print(f"🔄 Restored backup for {attraction_name}")
+                if os.path.exists(db_path) and os.path.samefile(backup_path, db_path):
+                    # Never replaced - detach the hard-linked backup so later writes don't change it
+                    temp_path = backup_path + ".tmp"
+                    shutil.copy2(db_path, temp_path)
+                    os.replace(temp_path, backup_path)
+                    print(f"🔄 {attraction_name} database left unchanged")
+                else:
+                    shutil.copy2(backup_path, db_path)
+                    print(f"🔄 Restored backup for {attraction_name}")
             return False
     
     def migrate_all_databases(self):
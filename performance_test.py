@@ -6,6 +6,7 @@ Tests database performance with large datasets
 
 import time
 import random
+import statistics
 from ticket_database import TicketDatabase
 
 def test_database_performance(attraction_name, test_count=100):
@@ -33,15 +34,16 @@ def test_database_performance(attraction_name, test_count=100):
     
     validation_times = []
     
+    # One untimed lookup first so the timings measure steady state, not opening the connection
+    db.validate_ticket("TICKET_C_001_1P_TEST", attraction_name)
+    
     for i in range(test_count):
         # Generate random ticket (might not exist)
         ticket_no = f"TICKET_C_{random.randint(1, 999):03d}_{random.randint(1, 6)}P_TEST"
         
-        start_time = time.time()
-        result = db.validate_ticket(ticket_no)
-        end_time = time.time()
-        
-        validation_time = (end_time - start_time) * 1000  # Convert to ms
+        start = time.perf_counter_ns()
+        result = db.validate_ticket(ticket_no, attraction_name)
+        validation_time = (time.perf_counter_ns() - start) / 1e6  # Convert to ms
         validation_times.append(validation_time)
         
         if (i + 1) % 20 == 0:
@@ -49,11 +51,13 @@ def test_database_performance(attraction_name, test_count=100):
     
     # Calculate statistics
     avg_validation = sum(validation_times) / len(validation_times)
+    median_validation = statistics.median(validation_times)
     min_validation = min(validation_times)
     max_validation = max(validation_times)
     
     print(f"✅ Validation Performance:")
     print(f"   Average: {avg_validation:.2f}ms")
+    print(f"   Median: {median_validation:.2f}ms")
     print(f"   Minimum: {min_validation:.2f}ms")
     print(f"   Maximum: {max_validation:.2f}ms")
     print()
@@ -65,19 +69,19 @@ def test_database_performance(attraction_name, test_count=100):
     stats_times = []
     
     for i in range(10):  # Fewer tests for stats
-        start_time = time.time()
+        start = time.perf_counter_ns()
         stats = db.get_stats()
-        end_time = time.time()
-        
-        stats_time = (end_time - start_time) * 1000
+        stats_time = (time.perf_counter_ns() - start) / 1e6
         stats_times.append(stats_time)
     
     avg_stats = sum(stats_times) / len(stats_times)
+    median_stats = statistics.median(stats_times)
     min_stats = min(stats_times)
     max_stats = max(stats_times)
     
     print(f"✅ Statistics Performance:")
     print(f"   Average: {avg_stats:.2f}ms")
+    print(f"   Median: {median_stats:.2f}ms")
     print(f"   Minimum: {min_stats:.2f}ms")
     print(f"   Maximum: {max_stats:.2f}ms")
     print()
@@ -89,19 +93,19 @@ def test_database_performance(attraction_name, test_count=100):
     scan_times = []
     
     for i in range(10):
-        start_time = time.time()
+        start = time.perf_counter_ns()
         today_scans = db.get_today_scans()
-        end_time = time.time()
-        
-        scan_time = (end_time - start_time) * 1000
+        scan_time = (time.perf_counter_ns() - start) / 1e6
         scan_times.append(scan_time)
     
     avg_scan = sum(scan_times) / len(scan_times)
+    median_scan = statistics.median(scan_times)
     min_scan = min(scan_times)
     max_scan = max(scan_times)
     
     print(f"✅ Today's Scans Performance:")
     print(f"   Average: {avg_scan:.2f}ms")
+    print(f"   Median: {median_scan:.2f}ms")
     print(f"   Minimum: {min_scan:.2f}ms")
     print(f"   Maximum: {max_scan:.2f}ms")
     print()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+QR Decoder for SOU Raspberry Pi
+Grayscale QR decoding with a cheap static-scene gate in front of pyzbar
+"""
+
+import collections
+import os
+import cv2
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from pyzbar import pyzbar
+from pyzbar.pyzbar import ZBarSymbol
+from qr_preproc import preproc, tiny_shape
+
+# Tickets are QR only - skip zbar's 1D barcode scan passes entirely
+QR_ONLY = [ZBarSymbol.QRCODE]
+
+# "opencv" decodes a located code with QRCodeDetector first (pyzbar only when that fails),
+# "pyzbar" leaves all decoding to pyzbar
+QR_BACKEND = os.environ.get("SOU_QR_BACKEND", "opencv")
+
+class QRDecoder:
+    """Decodes QR codes from camera frames, skipping pyzbar on unchanged scenes"""
+
+    def __init__(self, motion_threshold=3.0, max_skipped_frames=15, full_frame_interval=10, ring_size=3,
+                 backend=QR_BACKEND):
+        """Initialize decoder"""
+        self.use_opencv = backend == "opencv"  # Decode located codes with OpenCV before pyzbar
+        self.motion_threshold = motion_threshold  # Mean abs diff (0-255) that counts as motion
+        self.max_skipped_frames = max_skipped_frames  # Force a full decode at least this often
+        self.full_frame_interval = full_frame_interval  # ROI decodes between full-frame decodes
+        self._prev_tiny = None
+        self._last_diff = 0.0
+        self._skipped = 0
+        self._roi_decodes = 0
+        self._full_pass = False  # Whether the last _decode_current() already scanned the whole frame
+        
+        # Recent motion frames whose ROI decode found nothing, each given a full-frame
+        # pass in the background (pyzbar and cv2 release the GIL while scanning)
+        self._retries = collections.deque()
+        self._ring_size = ring_size
+        self._pool = ThreadPoolExecutor(max_workers=ring_size, thread_name_prefix="QRDecoder")
+        
+        # Reused per-frame buffers (no allocator churn in the capture loop)
+        self._gray_buf = np.empty((480, 640), dtype=np.uint8)
+        self._tiny_buf = np.empty(tiny_shape(self._gray_buf.shape), dtype=np.uint8)
+        
+        # Finder-pattern locator used to crop the frame before pyzbar (and to decode, with "opencv")
+        self._qr_det = cv2.QRCodeDetector()
+        self._cv_decode = self._qr_det.decode
+        
+        # Bind hot-path callables once instead of per-frame module lookups
+        self._decode = pyzbar.decode
+        self._cv_cvt = cv2.cvtColor
+
+    def scene_changed(self, frame):
+        """Check the subsampled luma of a BGR frame against the last decoded one"""
+        tiny, diff = preproc(frame, self._prev_tiny, out=self._tiny_buf)
+        self._last_diff = diff
+        if self._skipped < self.max_skipped_frames and diff < self.motion_threshold:
+            self._skipped += 1
+            return False
+
+        # Keep this sample as the reference and write the next one into the old reference
+        spare = self._prev_tiny if self._prev_tiny is not None else np.empty_like(tiny)
+        self._prev_tiny, self._tiny_buf = tiny, spare
+        self._skipped = 0
+        return True
+
+    def to_gray(self, frame):
+        """Convert a BGR frame to grayscale in the reused buffer"""
+        if self._gray_buf.shape != frame.shape[:2]:
+            self._gray_buf = np.empty(frame.shape[:2], dtype=np.uint8)
+        return self._cv_cvt(frame, cv2.COLOR_BGR2GRAY, dst=self._gray_buf)
+
+    def detect(self, gray):
+        """Return the corner points of the QR code in the frame, or None if none is found"""
+        ok, pts = self._qr_det.detect(gray)
+        if not ok or pts is None:
+            return None
+        return pts
+
+    def locate(self, gray, pts, pad=20):
+        """Crop the frame to the QR code at the given corner points (padded), or None"""
+        x, y, w, h = cv2.boundingRect(pts.reshape(-1, 2).astype(np.int32))
+        frame_h, frame_w = gray.shape[:2]
+        x0, y0 = max(x - pad, 0), max(y - pad, 0)
+        x1, y1 = min(x + w + pad, frame_w), min(y + h + pad, frame_h)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        return gray[y0:y1, x0:x1]
+
+    def decode(self, frame):
+        """Return the first QR code's text in a BGR frame (or a recent motion frame), or None"""
+        # A background retry of an earlier motion frame may have found the code
+        qr_data = self._collect_retries()
+        if qr_data is not None:
+            return qr_data
+
+        # Static scene (idle gate) - nothing new for pyzbar to find
+        if not self.scene_changed(frame):
+            return None
+
+        qr_data = self._decode_current(frame)
+        if qr_data is not None:
+            self._cancel_retries()
+            return qr_data
+
+        # Motion but no code in the located ROI - retry the whole frame off the scan loop
+        if not self._full_pass and self._last_diff >= self.motion_threshold:
+            if len(self._retries) >= self._ring_size:
+                self._retries.popleft().cancel()
+            self._retries.append(self._pool.submit(self._decode_full, frame))
+        return None
+
+    def _collect_retries(self):
+        """Return the text from any finished background retry, without waiting on the rest"""
+        retries = self._retries
+        while retries and retries[0].done():
+            future = retries.popleft()
+            if future.cancelled() or future.exception() is not None:
+                continue
+            qr_data = future.result()
+            if qr_data is not None:
+                self._cancel_retries()
+                return qr_data
+        return None
+
+    def _cancel_retries(self):
+        """Drop pending retries - the code they were looking for has been found"""
+        while self._retries:
+            self._retries.popleft().cancel()
+
+    def _decode_current(self, frame):
+        """Decode the newest frame, cropping to the located code when possible"""
+        # ZBar only needs luminance - hand it one channel instead of three
+        gray = self.to_gray(frame)
+
+        # Decode only the located code, with a periodic full-frame pass so
+        # codes the locator misses are still picked up
+        if self._roi_decodes < self.full_frame_interval:
+            pts = self.detect(gray)
+            if pts is not None:
+                self._roi_decodes += 1
+                self._full_pass = False
+
+                # The finder patterns are already found - OpenCV's decoder can reuse them
+                if self.use_opencv:
+                    text = self._cv_decode(gray, pts)[0]
+                    if text:
+                        return text
+
+                roi = self.locate(gray, pts)
+                if roi is not None:
+                    return self._first_code(self._decode(roi, symbols=QR_ONLY))
+
+        self._roi_decodes = 0
+        self._full_pass = True
+        return self._first_code(self._decode(gray, symbols=QR_ONLY))
+
+    def _decode_full(self, frame):
+        """Full-frame decode used by the worker pool (no shared buffers)"""
+        gray = self._cv_cvt(frame, cv2.COLOR_BGR2GRAY)
+        return self._first_code(self._decode(gray, symbols=QR_ONLY))
+
+    def _first_code(self, qr_codes):
+        """Return the first decoded QR code's text, or None"""
+        if qr_codes:
+            return qr_codes[0].data.decode('utf-8')
+        return None
+
+    def close(self):
+        """Release the decode worker threads"""
+        self._cancel_retries()
+        self._pool.shutdown(wait=False)
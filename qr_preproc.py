@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+QR Frame Preprocessing for SOU Raspberry Pi
+Fused BGR->luma subsample + frame difference used to gate QR decoding
+"""
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+TILE = 8  # One luma sample per 8x8 tile (640x480 -> 80x60)
+LUMA_WEIGHTS = np.array([0.114, 0.587, 0.299], dtype=np.float32)  # B, G, R
+
+def tiny_shape(frame_shape):
+    """Shape of the tiny luma image produced for a frame of the given shape"""
+    return frame_shape[0] // TILE, frame_shape[1] // TILE
+
+def _preproc_numpy(frame_bgr, prev_tiny, tiny):
+    """Strided NumPy fallback - touches only the sampled pixels"""
+    th, tw = tiny.shape
+    half = TILE // 2
+    sample = frame_bgr[half:th * TILE:TILE, half:tw * TILE:TILE]
+    luma = sample @ LUMA_WEIGHTS
+    luma += 0.5
+    tiny[...] = luma
+
+    if prev_tiny is None:
+        return tiny, float('inf')
+    diff = np.abs(tiny.astype(np.int16) - prev_tiny).mean()
+    return tiny, float(diff)
+
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _preproc_kernel(frame_bgr, prev_tiny, has_prev, tiny):
+        """Single pass: sample luma per tile and accumulate abs diff vs previous"""
+        th, tw = tiny.shape
+        row_diff = np.zeros(th, dtype=np.float64)
+
+        for ty in numba.prange(th):
+            y = ty * TILE + TILE // 2
+            acc = 0.0
+            for tx in range(tw):
+                x = tx * TILE + TILE // 2
+                luma = (0.114 * frame_bgr[y, x, 0] +
+                        0.587 * frame_bgr[y, x, 1] +
+                        0.299 * frame_bgr[y, x, 2])
+                value = np.uint8(luma + 0.5)
+                tiny[ty, tx] = value
+                if has_prev:
+                    acc += abs(np.float64(value) - np.float64(prev_tiny[ty, tx]))
+            row_diff[ty] = acc
+
+        return tiny, row_diff.sum() / (th * tw)
+
+    _NO_PREV = np.zeros((1, 1), dtype=np.uint8)
+
+def preproc(frame_bgr, prev_tiny, out=None):
+    """
+    Downsample a BGR frame to one luma sample per tile and diff it against
+    the previous result
+
+    Args:
+        frame_bgr: BGR uint8 frame
+        prev_tiny: Previous tiny image, or None
+        out: Optional preallocated uint8 buffer of tiny_shape(frame.shape)
+             (must not be prev_tiny)
+
+    Returns:
+        (tiny, diff) - tiny uint8 luma image and mean abs difference
+        (inf when there is no comparable previous frame)
+    """
+    shape = tiny_shape(frame_bgr.shape)
+    if out is None or out.shape != shape:
+        out = np.empty(shape, dtype=np.uint8)
+    if prev_tiny is not None and prev_tiny.shape != shape:
+        prev_tiny = None
+
+    if numba is None:
+        return _preproc_numpy(frame_bgr, prev_tiny, out)
+
+    if prev_tiny is None:
+        tiny, _ = _preproc_kernel(frame_bgr, _NO_PREV, False, out)
+        return tiny, float('inf')
+    tiny, diff = _preproc_kernel(frame_bgr, prev_tiny, True, out)
+    return tiny, float(diff)
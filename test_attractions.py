@@ -57,18 +57,18 @@ def test_display_screens():
     
     # Test waiting screen
     print("📱 Creating waiting screen...")
-    waiting_screen = dm.create_waiting_screen(5)
+    dm.render_waiting(5)
     print("✅ Waiting screen created")
     
     # Test success screen
     print("✅ Creating success screen...")
     ticket_info = {'persons_allowed': 2, 'persons_entered': 1}
-    success_screen = dm.create_success_screen(ticket_info, 6)
+    dm.render_success(ticket_info, 6)
     print("✅ Success screen created")
     
     # Test error screen
     print("❌ Creating error screen...")
-    error_screen = dm.create_error_screen("QR already scanned", 6)
+    dm.render_error("QR already scanned", 6)
     print("✅ Error screen created")
     
     dm.cleanup()
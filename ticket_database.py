@@ -6,9 +6,71 @@ Manages ticket validation for multiple attractions
 
 import sqlite3
 import os
+import threading
 from datetime import datetime
 from ticket_parser import TicketParser
 
+# Single scan_history INSERT text shared by every logging path, so sqlite3's
+# statement cache compiles it once per connection
+INSERT_SCAN_SQL = 'INSERT INTO scan_history (ticket_no, result, reason) VALUES (?, ?, ?)'
+
+# Insert a server ticket, or refresh an existing one without lowering local used counts
+# (is_synced is left alone so pending local scans still get synced)
+UPSERT_TICKET_SQL = '''
+    INSERT INTO tickets
+    (ticket_no, booking_date, reference_no, A_pax, A_used, B_pax, B_used, C_pax, C_used, is_synced)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
+    ON CONFLICT(ticket_no) DO UPDATE SET
+        booking_date = excluded.booking_date,
+        reference_no = excluded.reference_no,
+        A_pax = excluded.A_pax, A_used = MAX(A_used, excluded.A_used),
+        B_pax = excluded.B_pax, B_used = MAX(B_used, excluded.B_used),
+        C_pax = excluded.C_pax, C_used = MAX(C_used, excluded.C_used)
+'''
+
+# validate_ticket's lookup and guarded increment, one fixed text per attraction letter
+# (built once here rather than formatted on every call)
+VALIDATE_SELECT_SQL = {
+    short: f'SELECT {short}_pax, {short}_used, is_synced, booking_date FROM tickets WHERE ticket_no = ?'
+    for short in "ABC"
+}
+VALIDATE_UPDATE_SQL = {
+    short: f'''
+        UPDATE tickets
+        SET {short}_used = {short}_used + 1,
+            is_synced = 0,
+            last_scan = CURRENT_TIMESTAMP
+        WHERE ticket_no = ? AND {short}_used < {short}_pax
+    '''
+    for short in "ABC"
+}
+
+# Gate display names and the attraction letter used in column names
+ATTRACTION_SHORT_NAMES = {
+    "SOU Entry": "A",
+    "Jungle Safari": "B",
+    "Cactus Garden": "C"
+}
+
+def _init_conn(conn):
+    """Apply the per-connection PRAGMAs every TicketDatabase connection runs with"""
+    conn.executescript('''
+        PRAGMA synchronous=NORMAL;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA cache_size=-20000;
+        PRAGMA mmap_size=268435456;
+    ''')
+    return conn
+
+def attraction_short_name(attraction_name):
+    """Normalize "A", "AttractionA" or a gate display name to its attraction letter"""
+    short = ATTRACTION_SHORT_NAMES.get(attraction_name)
+    if short is not None:
+        return short
+    if attraction_name.startswith("Attraction"):
+        return attraction_name[-1]  # Get last character (A, B, or C)
+    return attraction_name.upper()
+
 class TicketDatabase:
     def __init__(self, attraction_name):
         """Initialize database for specific attraction"""
@@ -32,14 +94,40 @@ class TicketDatabase:
             pass
         
         self.ticket_parser = TicketParser(gate_mapping=gate_mapping)  # Initialize ticket parser with config
+        self._local = threading.local()  # One persistent connection per thread
         self.init_database()
     
+    def _connect(self):
+        """Return this thread's persistent connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = _init_conn(sqlite3.connect(self.db_path))
+            self._local.conn = conn
+        return conn
+    
+    def _cursor(self):
+        """Return this thread's persistent cursor on its persistent connection"""
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None:
+            cursor = self._connect().cursor()
+            self._local.cursor = cursor
+        return cursor
+    
+    def close(self):
+        """Close this thread's persistent connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+            self._local.cursor = None
+    
     def init_database(self):
         """Create database and tables if they don't exist"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
         # Optimize SQLite for better performance on Raspberry Pi
+        cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')  # Only applies to a new (empty) database
         cursor.execute('PRAGMA journal_mode=WAL')  # Write-Ahead Logging for better concurrency
         cursor.execute('PRAGMA synchronous=NORMAL')  # Balance between safety and speed
         cursor.execute('PRAGMA cache_size=10000')  # Increase cache size for 4GB RAM
@@ -91,7 +179,7 @@ class TicketDatabase:
     
     def add_ticket(self, ticket_no, booking_date, reference_no, attractions_data):
         """Add a new ticket to the database with new structure"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         try:
@@ -155,11 +243,10 @@ class TicketDatabase:
                 ''', (ticket_no, booking_date, reference_no, a_pax, a_used, b_pax, b_used, c_pax, c_used))
             
             conn.commit()
-            conn.close()
             return True
         except Exception as e:
             print(f"Error adding ticket: {e}")
-            conn.close()
+            conn.rollback()
             return False
     
     def add_tickets_bulk(self, tickets_data):
@@ -167,11 +254,15 @@ class TicketDatabase:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
-        # Apply performance optimizations for bulk operations
-        cursor.execute('PRAGMA synchronous=OFF')  # Disable sync for bulk inserts
-        cursor.execute('PRAGMA journal_mode=MEMORY')  # Use memory journal for bulk operations
+        # Apply performance optimizations for bulk operations (stays in WAL mode
+        # so the scanners can keep reading while a large import runs)
+        cursor.execute('PRAGMA synchronous=NORMAL')  # One sync per commit is plenty in WAL
+        cursor.execute('PRAGMA temp_store=MEMORY')
+        cursor.execute('PRAGMA cache_size=-64000')  # 64MB page cache for the import
         
         try:
+            # tickets_data may be any iterable (e.g. a generator) - all rows land in one transaction
+            cursor.execute('BEGIN')
             for ticket_data in tickets_data:
                 ticket_no = ticket_data[0]
                 
@@ -233,6 +324,29 @@ class TicketDatabase:
             conn.close()
             return False
     
+    def bulk_upsert(self, rows):
+        """
+        Insert or smart-update many tickets in one transaction
+        
+        Args:
+            rows: (ticket_no, booking_date, reference_no, A_pax, A_used, B_pax, B_used,
+                  C_pax, C_used) tuples, as for add_tickets_bulk
+        
+        Returns:
+            True if all rows were written
+        """
+        conn = self._connect()
+        
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(UPSERT_TICKET_SQL, rows)
+            conn.commit()
+            return True
+        except Exception as e:
+            print(f"Error upserting tickets in {self.attraction_name}: {e}")
+            conn.rollback()
+            return False
+    
     def validate_ticket(self, ticket_no_or_qr, attraction_name):
         """
         Validate ticket and return validation result for specific attraction
@@ -277,35 +391,18 @@ class TicketDatabase:
                         'persons_entered': 0
                     }
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        conn = self._connect()
+        cursor = self._cursor()
         
         # Normalize attraction name (handle both "A" and "AttractionA" formats)
-        if attraction_name.startswith("Attraction"):
-            attraction_short = attraction_name[-1]  # Get last character (A, B, or C)
-        elif attraction_name == "SOU Entry":
-            attraction_short = "A"
-        elif attraction_name == "Jungle Safari":
-            attraction_short = "B"
-        elif attraction_name == "Cactus Garden":
-            attraction_short = "C"
-        else:
-            attraction_short = attraction_name.upper()
+        attraction_short = attraction_short_name(attraction_name)
         
         # Get ticket data for the specific attraction (including booking_date for date validation)
-        attraction_col = f"{attraction_short}_pax"
-        used_col = f"{attraction_short}_used"
-        
-        cursor.execute(f'''
-            SELECT {attraction_col}, {used_col}, is_synced, booking_date
-            FROM tickets
-            WHERE ticket_no = ?
-        ''', (ticket_no,))
+        cursor.execute(VALIDATE_SELECT_SQL[attraction_short], (ticket_no,))
         
         result = cursor.fetchone()
         
         if not result:
-            conn.close()
             return {
                 'valid': False,
                 'reason': 'Invalid QR - Ticket not found',
@@ -325,7 +422,6 @@ class TicketDatabase:
                 
                 # Check if database booking date matches today's date
                 if db_date_str != today_str:
-                    conn.close()
                     return {
                         'valid': False,
                         'reason': f'Invalid date - Ticket not valid for today',
@@ -335,7 +431,6 @@ class TicketDatabase:
         
         # Check if ticket is valid for this attraction
         if persons_allowed == 0:
-            conn.close()
             return {
                 'valid': False,
                 'reason': f'Attraction mismatch - Ticket not valid for {attraction_short}',
@@ -345,7 +440,6 @@ class TicketDatabase:
         
         # Check if all persons have already entered
         if persons_entered >= persons_allowed:
-            conn.close()
             return {
                 'valid': False,
                 'reason': 'QR already scanned - All entries used',
@@ -354,26 +448,23 @@ class TicketDatabase:
             }
         
         # Ticket is valid, increment persons_entered with optimized query
-        cursor.execute(f'''
-            UPDATE tickets
-            SET {used_col} = {used_col} + 1,
-                is_synced = 0,
-                last_scan = CURRENT_TIMESTAMP
-            WHERE ticket_no = ? AND {used_col} < {attraction_col}
-        ''', (ticket_no,))
-        
-        # Check if update was successful (prevents race conditions)
-        if cursor.rowcount == 0:
-            conn.close()
-            return {
-                'valid': False,
-                'reason': 'QR already scanned - All entries used',
-                'persons_allowed': persons_allowed,
-                'persons_entered': persons_entered
-            }
-        
-        conn.commit()
-        conn.close()
+        try:
+            cursor.execute(VALIDATE_UPDATE_SQL[attraction_short], (ticket_no,))
+            
+            # Check if update was successful (prevents race conditions)
+            if cursor.rowcount == 0:
+                conn.rollback()  # End the no-op write transaction on the shared connection
+                return {
+                    'valid': False,
+                    'reason': 'QR already scanned - All entries used',
+                    'persons_allowed': persons_allowed,
+                    'persons_entered': persons_entered
+                }
+            
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
         
         return {
             'valid': True,
@@ -393,12 +484,17 @@ class TicketDatabase:
         Returns:
             dict with validation result
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
+        try:
+            return self._validate_and_log(conn, qr_code, attraction_name)
+        except Exception:
+            conn.rollback()  # Don't leave the persistent connection holding the write lock
+            raise
+    
+    def _validate_and_log(self, conn, qr_code, attraction_name):
+        """Body of validate_and_log_ticket; the caller rolls back if it raises"""
         cursor = conn.cursor()
         
-        # Optimize for performance
-        cursor.execute('PRAGMA synchronous=NORMAL')
-        
         # Get today's date ONCE at the start to ensure consistency
         today_str = datetime.now().strftime('%Y%m%d')
         
@@ -414,12 +510,8 @@ class TicketDatabase:
                 if booking_date_str != today_str:
                     # Log failed scan
                     reason = f'Ticket date mismatch - Ticket is for {booking_date_str[:4]}-{booking_date_str[4:6]}-{booking_date_str[6:8]}, today is {today_str[:4]}-{today_str[4:6]}-{today_str[6:8]}'
-                    cursor.execute('''
-                        INSERT INTO scan_history (ticket_no, result, reason)
-                        VALUES (?, 'FAILED', ?)
-                    ''', (qr_code[:50] if len(qr_code) > 50 else qr_code, reason))
+                    cursor.execute(INSERT_SCAN_SQL, (qr_code[:50] if len(qr_code) > 50 else qr_code, 'FAILED', reason))
                     conn.commit()
-                    conn.close()
                     return {
                         'valid': False,
                         'reason': f'Invalid date - Ticket not valid for today',
@@ -433,12 +525,8 @@ class TicketDatabase:
         if not parsed_ticket['valid']:
             # Log failed scan
             error_reason = parsed_ticket.get('error', 'Invalid QR code format')
-            cursor.execute('''
-                INSERT INTO scan_history (ticket_no, result, reason)
-                VALUES (?, 'FAILED', ?)
-            ''', (qr_code[:50] if len(qr_code) > 50 else qr_code, error_reason))  # Store first 50 chars if too long
+            cursor.execute(INSERT_SCAN_SQL, (qr_code[:50] if len(qr_code) > 50 else qr_code, 'FAILED', error_reason))  # Store first 50 chars if too long
             conn.commit()
-            conn.close()
             return {
                 'valid': False,
                 'reason': f'Invalid QR - {error_reason}',
@@ -452,16 +540,7 @@ class TicketDatabase:
         gate_info = parsed_ticket['gate_info']
         
         # Normalize attraction name (handle both "A" and "AttractionA" formats)
-        if attraction_name.startswith("Attraction"):
-            attraction_short = attraction_name[-1]  # Get last character (A, B, or C)
-        elif attraction_name == "SOU Entry":
-            attraction_short = "A"
-        elif attraction_name == "Jungle Safari":
-            attraction_short = "B"
-        elif attraction_name == "Cactus Garden":
-            attraction_short = "C"
-        else:
-            attraction_short = attraction_name.upper()
+        attraction_short = attraction_short_name(attraction_name)
         
         # Get passenger count for this attraction from QR code
         # Use gate mapping from ticket parser (loaded from config)
@@ -475,12 +554,8 @@ class TicketDatabase:
         if persons_allowed == 0:
             # Log failed scan
             reason = f'Attraction mismatch - Ticket not valid for {attraction_short}'
-            cursor.execute('''
-                INSERT INTO scan_history (ticket_no, result, reason)
-                VALUES (?, 'FAILED', ?)
-            ''', (reference_no, reason))
+            cursor.execute(INSERT_SCAN_SQL, (reference_no, 'FAILED', reason))
             conn.commit()
-            conn.close()
             return {
                 'valid': False,
                 'reason': reason,
@@ -537,12 +612,8 @@ class TicketDatabase:
                     if db_date_str != today_str:
                         # Log failed scan
                         reason = f'Ticket date mismatch - Database booking date is {db_booking_date}, today is {today_str[:4]}-{today_str[4:6]}-{today_str[6:8]}'
-                        cursor.execute('''
-                            INSERT INTO scan_history (ticket_no, result, reason)
-                            VALUES (?, 'FAILED', ?)
-                        ''', (reference_no, reason))
+                        cursor.execute(INSERT_SCAN_SQL, (reference_no, 'FAILED', reason))
                         conn.commit()
-                        conn.close()
                         return {
                             'valid': False,
                             'reason': f'Invalid date - Ticket not valid for today',
@@ -560,12 +631,8 @@ class TicketDatabase:
         # Check if all persons have already entered
         if persons_entered >= persons_allowed:
             # Log failed scan
-            cursor.execute('''
-                INSERT INTO scan_history (ticket_no, result, reason)
-                VALUES (?, 'FAILED', 'QR already scanned - All entries used')
-            ''', (reference_no,))
+            cursor.execute(INSERT_SCAN_SQL, (reference_no, 'FAILED', 'QR already scanned - All entries used'))
             conn.commit()
-            conn.close()
             return {
                 'valid': False,
                 'reason': 'QR already scanned - All entries used',
@@ -590,12 +657,8 @@ class TicketDatabase:
             persons_entered = current_result[0] if current_result else persons_entered
             
             # Log failed scan
-            cursor.execute('''
-                INSERT INTO scan_history (ticket_no, result, reason)
-                VALUES (?, 'FAILED', 'QR already scanned - All entries used')
-            ''', (reference_no,))
+            cursor.execute(INSERT_SCAN_SQL, (reference_no, 'FAILED', 'QR already scanned - All entries used'))
             conn.commit()
-            conn.close()
             
             return {
                 'valid': False,
@@ -605,13 +668,9 @@ class TicketDatabase:
             }
         
         # Log successful scan
-        cursor.execute('''
-            INSERT INTO scan_history (ticket_no, result, reason)
-            VALUES (?, 'SUCCESS', 'Valid Entry')
-        ''', (reference_no,))
+        cursor.execute(INSERT_SCAN_SQL, (reference_no, 'SUCCESS', 'Valid Entry'))
         
         conn.commit()
-        conn.close()
         
         return {
             'valid': True,
@@ -622,37 +681,53 @@ class TicketDatabase:
     
     def log_scan(self, ticket_no, result, reason):
         """Log scan attempt to history - optimized for performance"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Use optimized settings for logging
-        cursor.execute('PRAGMA synchronous=OFF')  # Faster writes for logging
-        
-        cursor.execute('''
-            INSERT INTO scan_history (ticket_no, result, reason)
-            VALUES (?, ?, ?)
-        ''', (ticket_no, result, reason))
-        
-        conn.commit()
-        conn.close()
+        conn = self._connect()
+        try:
+            conn.execute(INSERT_SCAN_SQL, (ticket_no, result, reason))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
     
     def get_today_scans(self):
         """Get count of scans today"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
+        # Range predicate so idx_scan_time is used instead of a full table scan
         cursor.execute('''
             SELECT COUNT(*) FROM scan_history
-            WHERE DATE(scan_time) = DATE('now')
+            WHERE scan_time >= DATE('now') AND scan_time < DATE('now', '+1 day')
         ''')
         
         count = cursor.fetchone()[0]
-        conn.close()
         return count
     
+    def get_hud_snapshot(self):
+        """
+        Get the on-screen counters in a single query
+        
+        Returns:
+            tuple (today_scans, total_tickets, unsynced_count)
+        """
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        # Range predicate on scan_time can use idx_scan_time (same day as DATE('now'))
+        cursor.execute('''
+            SELECT
+                (SELECT COUNT(*) FROM scan_history
+                 WHERE scan_time >= DATE('now') AND scan_time < DATE('now', '+1 day')),
+                (SELECT COUNT(*) FROM tickets),
+                (SELECT COUNT(*) FROM tickets WHERE is_synced = 0)
+        ''')
+        
+        snapshot = cursor.fetchone()
+        return snapshot
+    
     def get_ticket_info(self, ticket_no):
         """Get detailed ticket information"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -663,7 +738,6 @@ class TicketDatabase:
         ''', (ticket_no,))
         
         result = cursor.fetchone()
-        conn.close()
         
         if result:
             return {
@@ -683,7 +757,7 @@ class TicketDatabase:
     
     def get_ticket_for_sync(self, ticket_no):
         """Get ticket data in format for server sync"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -693,7 +767,6 @@ class TicketDatabase:
         ''', (ticket_no,))
         
         result = cursor.fetchone()
-        conn.close()
         
         if result:
             booking_date, reference_no, a_pax, a_used, b_pax, b_used, c_pax, c_used = result
@@ -710,7 +783,7 @@ class TicketDatabase:
     
     def get_unsynced_tickets(self):
         """Get all unsynced tickets for background sync service"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -719,20 +792,18 @@ class TicketDatabase:
         ''')
         
         results = cursor.fetchall()
-        conn.close()
         
         return [row[0] for row in results]
     
     def mark_ticket_synced(self, ticket_no):
         """Mark a ticket as synced"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             # Check if ticket exists first
             cursor.execute('SELECT 1 FROM tickets WHERE ticket_no = ?', (ticket_no,))
             if not cursor.fetchone():
-                conn.close()
                 print(f"Warning: Ticket {ticket_no} not found in {self.attraction_name} database")
                 return False
             
@@ -743,7 +814,6 @@ class TicketDatabase:
             
             rows_affected = cursor.rowcount
             conn.commit()
-            conn.close()
             
             if rows_affected > 0:
                 print(f"Successfully marked ticket {ticket_no} as synced in {self.attraction_name}")
@@ -755,23 +825,30 @@ class TicketDatabase:
         except Exception as e:
             print(f"Error marking ticket {ticket_no} as synced in {self.attraction_name}: {e}")
             if 'conn' in locals():
-                conn.close()
+                conn.rollback()
             return False
     
     def ticket_exists(self, ticket_no):
         """Check if ticket exists in database"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('SELECT 1 FROM tickets WHERE ticket_no = ?', (ticket_no,))
         result = cursor.fetchone()
-        conn.close()
         
         return result is not None
     
+    def get_ticket_numbers(self, booking_date):
+        """Return the set of ticket numbers booked for a date (one query)"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT ticket_no FROM tickets WHERE booking_date = ?', (booking_date,))
+        return {row[0] for row in cursor.fetchall()}
+    
     def get_sync_debug_info(self, ticket_no):
         """Get debug information about a ticket's sync status"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -781,7 +858,6 @@ class TicketDatabase:
         ''', (ticket_no,))
         
         result = cursor.fetchone()
-        conn.close()
         
         if result:
             return {
@@ -799,7 +875,7 @@ class TicketDatabase:
     
     def get_stats(self):
         """Get database statistics"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         # Total tickets
@@ -811,16 +887,7 @@ class TicketDatabase:
         
         # Total entries today for this attraction
         # Normalize attraction name (handle both "A" and "AttractionA" formats)
-        if self.attraction_name.startswith("Attraction"):
-            attraction_short = self.attraction_name[-1]  # Get last character (A, B, or C)
-        elif self.attraction_name == "SOU Entry":
-            attraction_short = "A"
-        elif self.attraction_name == "Jungle Safari":
-            attraction_short = "B"
-        elif self.attraction_name == "Cactus Garden":
-            attraction_short = "C"
-        else:
-            attraction_short = self.attraction_name.upper()
+        attraction_short = attraction_short_name(self.attraction_name)
         
         attraction_col = f"{attraction_short}_used"
         cursor.execute(f'''
@@ -833,7 +900,6 @@ class TicketDatabase:
         cursor.execute('SELECT COUNT(*) FROM tickets WHERE is_synced = 0')
         unsynced_count = cursor.fetchone()[0]
         
-        conn.close()
         
         return {
             'total_tickets': total_tickets,
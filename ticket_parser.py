@@ -7,6 +7,11 @@ Handles QR code parsing and HMAC verification for offline ticket validation
 import hmac
 import hashlib
 import base64
+import re
+
+# Structural shape of a ticket QR code (YYYYMMDD-SERIAL-GATES-VERIFICATIONCODE);
+# anything else can be rejected without parsing or touching the database
+QR_CODE_FORMAT = re.compile(r'\d{8}-\d+-(?:\d{4})*-.+')
 
 
 class TicketParser: